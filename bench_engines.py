@@ -0,0 +1,66 @@
+import argparse
+import contextlib
+import io
+import os
+import time
+from datetime import datetime, timedelta
+
+from mock_dear_server import generate_sales, start_mock_server
+
+# === SYNC vs ASYNC ENGINE BENCHMARK ===
+# Runs both engines over the same synthetic window on the local mock server and
+# prints wall time and calls per sale. Nothing here talks to the real Dear API.
+
+
+def run_engine(engine, base_url, sales, days_back, min_interval, max_in_flight):
+    # main.py reads the base URL at import time, so set it before the first import
+    os.environ["DEAR_API_BASE_URL"] = base_url
+    from verve import main
+    from verve.rate_limit import rate_limiter
+    from verve.structured_log import flush_logs
+
+    # Both engines should pay for every download, not reuse the other's caches
+    main.disable_local_state()
+    main.API_BASE_URL = base_url
+    rate_limiter.min_interval_seconds = min_interval
+    rate_limiter.calls = 0
+
+    today = datetime.today()
+    from_str = (today - timedelta(days=days_back)).strftime("%Y-%m-%d")
+    to_str = today.strftime("%Y-%m-%d")
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if engine == "async":
+            from verve import async_client
+            async_client.API_BASE_URL = base_url
+            results = async_client.run_async_sync(from_str, to_str, {}, max_in_flight)
+        else:
+            results = main.run_sync_engine(from_str, to_str, {})
+        flush_logs()
+    elapsed = time.perf_counter() - started
+    return results, rate_limiter.calls, elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the sync and async engines on the mock Dear API.")
+    parser.add_argument("--sales", type=int, default=200)
+    parser.add_argument("--days-back", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock latency per request in seconds.")
+    parser.add_argument("--min-interval", type=float, default=0.0,
+                        help="Rate limiter spacing between call starts (seconds).")
+    parser.add_argument("--max-in-flight", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'engine':<8}{'sales':>8}{'calls':>8}{'calls/sale':>12}{'wall (s)':>10}")
+    for engine in ("sync", "async"):
+        # Fresh data per engine so both do the same amount of work
+        server, state, base_url = start_mock_server(generate_sales(args.sales, args.days_back), args.latency)
+        try:
+            results, calls, elapsed = run_engine(engine, base_url, args.sales, args.days_back,
+                                                 args.min_interval, args.max_in_flight)
+        finally:
+            server.shutdown()
+        processed = sum(results.values())
+        per_sale = calls / processed if processed else 0.0
+        print(f"{engine:<8}{processed:>8}{calls:>8}{per_sale:>12.2f}{elapsed:>10.2f}")
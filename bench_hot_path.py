@@ -0,0 +1,314 @@
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+# === PER-SALE HOT PATH MICRO-BENCHMARKS ===
+# Times the CPU work update_order_date_for_sale does for each sale, on synthetic /sale/order
+# documents with 1 to 2,000 lines and every AdditionalAttributes state we have met in the wild:
+#   merge       {**essential, **detailed} as build_update_payload does it
+#   skip_check  should_skip_existing_stamp (AdditionalAttributes lookup + stamp cache record)
+#   date_format format_order_date_for_attribute (strptime/strftime)
+#   json_encode the body requests.put(json=...) serialises
+#   decide_and_build  skip check + build_update_payload + json encoding, over a mix of states
+#   classify_page     decision_kernel.classify_sales over a whole SaleList page, Python loop vs arrow
+#   stamped_set       StampedSaleSet.contains for a known and an unknown SaleID
+#
+# Each run is saved to bench_results/hot_path/<timestamp>.json and compared with the previous one:
+#   python bench_hot_path.py                   # full suite
+#   python bench_hot_path.py --quick -k merge  # fewer sizes, only benchmarks whose name contains "merge"
+# No network access: the engine functions are called directly and their prints are discarded.
+
+RESULTS_DIR = os.path.join("bench_results", "hot_path")
+LINE_COUNTS = (1, 10, 100, 500, 2000)
+QUICK_LINE_COUNTS = (1, 100, 2000)
+PAGE_SIZES = (250, 1000)    # SaleList summaries per classify_page call (1000 is the API's largest page)
+STAMPED_SET_SIZE = 200000
+MIN_ROUND_SECONDS = 0.005   # each round repeats the call until it takes at least this long
+DEFAULT_ROUNDS = 15
+REGRESSION_THRESHOLD = 0.2  # flag benchmarks more than 20% slower than the previous run
+
+# AdditionalAttributes as they arrive from /sale/order
+ATTRIBUTE_STATES = {
+    "missing": None,
+    "null": "null",
+    "empty_dict": {},
+    "blank": {"AdditionalAttribute1": "", "AdditionalAttribute2": ""},
+    "whitespace": {"AdditionalAttribute2": "   "},
+    "stamped": "stamped",
+    "stamped_iso": "stamped_iso",
+    "not_a_dict": ["unexpected"],
+}
+
+
+# === SYNTHETIC ORDERS ===
+def _line(rng, n):
+    quantity = rng.randint(1, 40)
+    price = round(rng.uniform(1, 500), 4)
+    return {
+        "ProductID": str(uuid.UUID(int=rng.getrandbits(128))),
+        "SKU": f"SKU-{rng.randint(0, 99999):05d}",
+        "Name": f"Synthetic product {n} " + "x" * rng.randint(0, 60),
+        "Quantity": quantity,
+        "Price": price,
+        "Discount": rng.choice((0, 0, 5, 10)),
+        "Tax": round(quantity * price * 0.1, 4),
+        "AverageCost": round(price * 0.6, 4),
+        "TaxRule": "Tax on Sales",
+        "Comment": rng.choice(("", "", "Gift wrap", "Deliver to back door")),
+        "DropShip": False,
+        "BackorderQuantity": 0,
+        "Total": round(quantity * price, 4),
+    }
+
+
+def generate_order(line_count, attribute_state="blank", seed=0):
+    """A /sale/order document plus the SaleList essentials for it. Returns (essential, detailed)."""
+    rng = random.Random(seed)
+    sale_id = str(uuid.UUID(int=rng.getrandbits(128)))
+    order_date = datetime(2025, 1, 1) + timedelta(days=rng.randint(0, 365))
+    order_date_str = order_date.strftime("%Y-%m-%dT00:00:00")
+    lines = [_line(rng, n) for n in range(line_count)]
+    total = round(sum(line["Total"] for line in lines), 4)
+
+    detailed = {
+        "ID": sale_id,
+        "Customer": f"Customer {rng.randint(1, 500)}",
+        "CustomerID": str(uuid.UUID(int=rng.getrandbits(128))),
+        "Status": "ORDERED",
+        "OrderDate": order_date_str,
+        "Location": "Main Warehouse",
+        "ShippingAddress": {"Line1": "1 Test Street", "City": "Springfield", "Country": "US", "Postcode": "12345"},
+        "Order": {"SaleOrderNumber": f"SO-{rng.randint(1, 99999):05d}", "Status": "AUTHORISED",
+                  "Lines": lines, "AdditionalCharges": [], "Total": total, "Tax": round(total * 0.1, 4)},
+        "Invoices": [{"InvoiceNumber": f"INV-{rng.randint(1, 99999):05d}", "Status": "DRAFT",
+                      "Lines": [dict(line) for line in lines], "Total": total}],
+        "Fulfilments": [],
+    }
+    state = ATTRIBUTE_STATES[attribute_state]
+    if state == "null":
+        detailed["AdditionalAttributes"] = None
+    elif state == "stamped":
+        detailed["AdditionalAttributes"] = {"AdditionalAttribute2": order_date.strftime("%m/%d/%Y")}
+    elif state == "stamped_iso":
+        detailed["AdditionalAttributes"] = {"AdditionalAttribute2": order_date.strftime("%Y-%m-%d")}
+    elif state is not None:
+        detailed["AdditionalAttributes"] = json.loads(json.dumps(state))
+
+    essential = {
+        "SaleID": sale_id,
+        "OrderDate": order_date_str,
+        "CustomerID": detailed["CustomerID"],
+        "Customer": detailed["Customer"],
+        "OrderNumber": detailed["Order"]["SaleOrderNumber"],
+        "Updated": order_date.strftime("%Y-%m-%dT08:00:00"),
+    }
+    return essential, detailed
+
+
+def generate_page(count, seed=0):
+    """count SaleList summaries over two weeks plus a stamp cache that knows most of them.
+
+    Returns (sales, stamp_cache, from_date, to_date) with a one-week window in the middle.
+    """
+    rng = random.Random(seed)
+    start = datetime(2025, 6, 1)
+    sales, stamp_cache = [], {}
+    for i in range(count):
+        sale_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        order_date = start + timedelta(days=rng.randint(0, 13))
+        sales.append({"SaleID": sale_id, "OrderNumber": f"SO-{i + 1:05d}", "OrderDate": order_date.strftime("%Y-%m-%dT00:00:00"),
+                      "Customer": f"Customer {i % 50}", "Status": "ORDERED", "Updated": order_date.strftime("%Y-%m-%dT08:00:00")})
+        known = rng.random()
+        if known < 0.5:
+            stamp_cache[sale_id] = {"OrderDate": sales[-1]["OrderDate"], "AdditionalAttribute2": order_date.strftime("%m/%d/%Y")}
+        elif known < 0.6:
+            stamp_cache[sale_id] = {"OrderDate": sales[-1]["OrderDate"], "AdditionalAttribute2": ""}
+        elif known < 0.65:
+            stamp_cache[sale_id] = {"OrderDate": sales[-1]["OrderDate"], "AdditionalAttribute2": "01/01/2020"}
+    return sales, stamp_cache, start + timedelta(days=4), start + timedelta(days=11)
+
+
+# === TIMING ===
+def benchmark(func):
+    """pytest-benchmark style: calibrate iterations per round, then time DEFAULT_ROUNDS rounds."""
+    iterations = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        if time.perf_counter() - started >= MIN_ROUND_SECONDS or iterations >= 1 << 20:
+            break
+        iterations *= 2
+
+    per_call = []
+    for _ in range(DEFAULT_ROUNDS):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        per_call.append((time.perf_counter() - started) / iterations)
+    return {
+        "min_us": round(min(per_call) * 1e6, 3),
+        "median_us": round(statistics.median(per_call) * 1e6, 3),
+        "mean_us": round(statistics.mean(per_call) * 1e6, 3),
+        "stddev_us": round(statistics.stdev(per_call) * 1e6, 3),
+        "ops_per_second": round(1 / statistics.median(per_call), 1),
+        "rounds": DEFAULT_ROUNDS,
+        "iterations": iterations,
+    }
+
+
+def build_suite(line_counts):
+    """(name, zero-argument callable) for every benchmark."""
+    from verve.main import (LIST_ONLY_FIELDS, build_update_payload, disable_local_state, format_order_date_for_attribute,
+                      should_skip_existing_stamp)
+    from verve.decision_kernel import _arrow, classify_sales
+
+    # The skip check and payload builder also feed the stamped set, quarantine and customer directory;
+    # keep them off so the timings do not depend on (or change) whatever state is in this directory
+    disable_local_state()
+    suite = []
+    for lines in line_counts:
+        essential, detailed = generate_order(lines, "blank", seed=lines)
+
+        def merge(essential=essential, detailed=detailed):
+            essential_for_put = {k: v for k, v in essential.items() if k not in LIST_ONLY_FIELDS}
+            return {**essential_for_put, **detailed}
+
+        payload, _ = build_update_payload(essential, detailed)
+
+        def json_encode(payload=payload):
+            # What requests does with json=...: compact dumps, then UTF-8 bytes
+            return json.dumps(payload, allow_nan=False).encode("utf-8")
+
+        suite.append((f"merge[lines={lines}]", merge))
+        suite.append((f"json_encode[lines={lines}]", json_encode))
+
+    for state in ATTRIBUTE_STATES:
+        essential, detailed = generate_order(10, state, seed=1)
+        suite.append((f"skip_check[{state}]",
+                      lambda essential=essential, detailed=detailed: should_skip_existing_stamp(essential, detailed, {})))
+
+    suite.append(("date_format[iso]", lambda: format_order_date_for_attribute("2025-06-19T00:00:00")))
+    suite.append(("date_format[unparseable]", lambda: format_order_date_for_attribute("19/06/2025")))
+
+    for lines in line_counts:
+        # One order per attribute state, so the mix of skips and writes is part of the measurement
+        orders = [generate_order(lines, state, seed=i) for i, state in enumerate(ATTRIBUTE_STATES)]
+        originals = [json.loads(json.dumps(detailed.get("AdditionalAttributes"))) for _, detailed in orders]
+
+        def decide_and_build(orders=orders, originals=originals):
+            for (essential, detailed), attributes in zip(orders, originals):
+                if should_skip_existing_stamp(essential, detailed, {}):
+                    continue
+                payload, _ = build_update_payload(essential, detailed)
+                if payload is not None:
+                    json.dumps(payload, allow_nan=False).encode("utf-8")
+                # build_update_payload stamps the document's own AdditionalAttributes dict;
+                # put the original back so every round makes the same decisions
+                if isinstance(attributes, dict):
+                    detailed["AdditionalAttributes"] = dict(attributes)
+
+        suite.append((f"decide_and_build[lines={lines},orders={len(orders)}]", decide_and_build))
+
+    for page_size in PAGE_SIZES:
+        sales, stamp_cache, from_date, to_date = generate_page(page_size, seed=page_size)
+        for kernel in ("python", "arrow") if _arrow() else ("python",):
+            suite.append((f"classify_page[{kernel},sales={page_size}]",
+                          lambda sales=sales, stamp_cache=stamp_cache, from_date=from_date, to_date=to_date, kernel=kernel:
+                          classify_sales(sales, from_date, to_date, stamp_cache, use_arrow=kernel == "arrow")))
+
+    stamped, known, unknown = build_stamped_set(STAMPED_SET_SIZE)
+    suite.append((f"stamped_set[hit,entries={STAMPED_SET_SIZE}]", lambda: stamped.contains(known)))
+    suite.append((f"stamped_set[miss,entries={STAMPED_SET_SIZE}]", lambda: stamped.contains(unknown)))
+    return suite
+
+
+def build_stamped_set(size, seed=0):
+    """A compacted StampedSaleSet of size random SaleIDs in a temporary directory.
+
+    Returns (set, a SaleID in it, a SaleID not in it).
+    """
+    from verve.stamped_set import StampedSaleSet
+
+    directory = tempfile.mkdtemp(prefix="verve_bench_")
+    atexit.register(shutil.rmtree, directory, True)
+    rng = random.Random(seed)
+    stamped = StampedSaleSet(os.path.join(directory, "stamped_sales.bin"))
+    sale_ids = [str(uuid.UUID(int=rng.getrandbits(128), version=4)) for _ in range(size + 1)]
+    for sale_id in sale_ids[:size]:
+        stamped.add(sale_id)
+    stamped.save(compact=True)
+    return stamped, sale_ids[size // 2], sale_ids[size]
+
+
+# === RESULTS ===
+def latest_results(directory=RESULTS_DIR):
+    if not os.path.isdir(directory):
+        return None
+    runs = sorted(f for f in os.listdir(directory) if f.endswith(".json"))
+    if not runs:
+        return None
+    with open(os.path.join(directory, runs[-1]), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_results(results, directory=RESULTS_DIR):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{datetime.now():%Y%m%dT%H%M%S}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    return path
+
+
+def print_results(results, previous):
+    previous_benchmarks = (previous or {}).get("benchmarks", {})
+    regressions = []
+    print(f"{'benchmark':<44}{'median (us)':>14}{'stddev':>10}{'ops/s':>14}{'vs previous':>14}")
+    for name, stats in results["benchmarks"].items():
+        change = ""
+        before = previous_benchmarks.get(name)
+        if before:
+            ratio = stats["median_us"] / before["median_us"] - 1
+            change = f"{ratio:+.1%}"
+            if ratio > REGRESSION_THRESHOLD:
+                regressions.append(name)
+        print(f"{name:<44}{stats['median_us']:>14.2f}{stats['stddev_us']:>10.2f}{stats['ops_per_second']:>14.0f}{change:>14}")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark the per-sale decision and payload code.")
+    parser.add_argument("--quick", action="store_true", help=f"Only {QUICK_LINE_COUNTS} lines per order.")
+    parser.add_argument("-k", dest="keyword", default=None, help="Only run benchmarks whose name contains this.")
+    parser.add_argument("--no-save", action="store_true", help="Do not store this run in bench_results/.")
+    args = parser.parse_args()
+
+    results = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "benchmarks": {},
+    }
+    # The engine functions print per sale; timing that console traffic would swamp the CPU work
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for name, func in build_suite(QUICK_LINE_COUNTS if args.quick else LINE_COUNTS):
+            if not args.keyword or args.keyword in name:
+                results["benchmarks"][name] = benchmark(func)
+
+    previous = latest_results()
+    regressions = print_results(results, previous)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) more than {REGRESSION_THRESHOLD:.0%} slower than the previous run: "
+              + ", ".join(regressions))
+    if not args.no_save:
+        print(f"\nResults saved to {save_results(results)}")
@@ -0,0 +1,74 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# === CLI STARTUP BENCHMARK ===
+# Cron runs and one-off lookups are short, so interpreter + import time is a real share of them.
+# Runs each command in a fresh interpreter several times and reports the median wall time above
+# a bare `python -c pass`. Exits 1 if any command's overhead exceeds --budget-ms, or if a command
+# exits with anything but its expected code (a crash on import is fast, not a pass), so CI can gate on it.
+#
+#   python bench_startup.py --runs 10 --budget-ms 250
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# command name -> (verve arguments, expected exit code)
+COMMANDS = {
+    "verve --help": (["--help"], 0),
+    # An order number nothing knows: a SaleID is echoed back (exit 0) even when no store has it
+    "verve lookup (local miss)": (["lookup", "SO-BENCH-MISS"], 1),
+    "verve sync --help": (["sync", "--help"], 0),
+}
+
+
+def time_command(args, runs, cwd, expected_returncode=0):
+    """Median wall time in ms, or None if a run crashed or exited with anything but expected_returncode.
+
+    An uncaught exception also exits with 1, so a traceback on stderr fails the command whatever its code.
+    """
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run(args, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        samples.append(time.perf_counter() - started)
+        if completed.returncode != expected_returncode or b"Traceback (most recent call last)" in completed.stderr:
+            print(f"[FAILED] {' '.join(args[1:])} exited with {completed.returncode} "
+                  f"(expected {expected_returncode}, no traceback):\n{completed.stderr.decode(errors='replace')[-2000:]}")
+            return None
+    return statistics.median(samples) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure `verve` startup time in fresh interpreters.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="Fail if a command takes more than this many ms over a bare interpreter.")
+    args = parser.parse_args()
+
+    # An empty working directory: no caches or .env to read, so every run does the same work
+    with tempfile.TemporaryDirectory() as cwd:
+        baseline = time_command([sys.executable, "-c", "pass"], args.runs, cwd)
+        print(f"{'command':<30}{'median (ms)':>13}{'over python (ms)':>18}")
+        print(f"{'python -c pass':<30}{baseline:>13.1f}{'':>18}")
+        over_budget = []
+        failed = []
+        for name, (command_args, expected_returncode) in COMMANDS.items():
+            elapsed = time_command([sys.executable, os.path.join(HERE, "verve_cli.py"), *command_args], args.runs, cwd,
+                                   expected_returncode)
+            if elapsed is None:
+                failed.append(name)
+                continue
+            overhead = elapsed - baseline
+            print(f"{name:<30}{elapsed:>13.1f}{overhead:>18.1f}")
+            if args.budget_ms is not None and overhead > args.budget_ms:
+                over_budget.append(name)
+
+    if failed:
+        print(f"[FAILED] Did not exit as expected: {', '.join(failed)}")
+    if over_budget:
+        print(f"[REGRESSION] Over the {args.budget_ms:.0f} ms startup budget: {', '.join(over_budget)}")
+    if failed or over_budget:
+        sys.exit(1)
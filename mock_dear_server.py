@@ -0,0 +1,214 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# === MOCK DEAR SYSTEMS API ===
+# A small in-memory stand-in for /salelist, /sale/order and PUT /sale, used to benchmark
+# the sync engines locally without touching a real account. Point the scripts at it with:
+#   DEAR_API_BASE_URL=http://127.0.0.1:8765/ExternalApi/v2 DEAR_API_CALL_DELAY_SECONDS=0 python main.py ...
+
+API_PREFIX = "/ExternalApi/v2"
+
+
+def generate_sales(count, days_back=7, stamped_fraction=0.5, seed=42):
+    rng = random.Random(seed)
+    today = datetime.today().replace(hour=0, minute=0, second=0, microsecond=0)
+    sales = {}
+    for i in range(count):
+        sale_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        order_date = today - timedelta(days=rng.randint(0, days_back))
+        attr2 = order_date.strftime("%m/%d/%Y") if rng.random() < stamped_fraction else ""
+        sales[sale_id] = {
+            "ID": sale_id,
+            "SaleID": sale_id,
+            "OrderNumber": f"SO-{i + 1:05d}",
+            "OrderDate": order_date.strftime("%Y-%m-%dT00:00:00"),
+            "Customer": f"Customer {i % 50}",
+            "CustomerID": str(uuid.UUID(int=i % 50 + 1)),
+            "Status": "ORDERED",
+            "Updated": order_date.strftime("%Y-%m-%dT08:00:00"),
+            "AdditionalAttributes": {"AdditionalAttribute2": attr2},
+        }
+    return sales
+
+
+class MockDearState:
+    def __init__(self, sales, latency_seconds=0.0, row_latency_seconds=0.0, max_concurrent=0, locked_every=0,
+                 nameless_every=0):
+        self.sales = sales
+        # The customer list is built before any names are blanked, so /customer still knows them all
+        self.customers = {}
+        for s in sales.values():
+            self.customers.setdefault(s["CustomerID"], {"ID": s["CustomerID"], "Name": s["Customer"],
+                                                        "LastModifiedOn": s["Updated"]})
+        # Every Nth sale has no Customer name, in its summary or its document (0 = none)
+        for i, s in enumerate(sorted(sales.values(), key=lambda s: s["OrderNumber"])):
+            if nameless_every and i % nameless_every == 0:
+                s["Customer"] = ""
+        # Every Nth sale (by order number) is locked: its PUT is rejected like a voided/locked order (0 = none)
+        self.locked = {s["ID"] for i, s in enumerate(sorted(sales.values(), key=lambda s: s["OrderNumber"]))
+                       if locked_every and i % locked_every == 0}
+        self.latency_seconds = latency_seconds
+        self.row_latency_seconds = row_latency_seconds  # extra /salelist latency per summary returned
+        self.max_concurrent = max_concurrent  # above this many open requests, answer 429 (0 = unlimited)
+        self.in_flight = 0
+        self.calls = {"salelist": 0, "sale_get": 0, "sale_put": 0, "customer": 0, "throttled": 0}
+        self.lock = threading.Lock()
+
+    def count(self, kind):
+        with self.lock:
+            self.calls[kind] += 1
+
+    def enter(self):
+        """Admit a request, or return False if it should be throttled."""
+        with self.lock:
+            if self.max_concurrent and self.in_flight >= self.max_concurrent:
+                self.calls["throttled"] += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+class MockDearHandler(BaseHTTPRequestHandler):
+    state = None  # set by start_mock_server
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output readable
+
+    def _send_json(self, status, body, etag=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _throttle(self):
+        self._send_json(429, {"Exception": "Too many requests"})
+
+    def do_GET(self):
+        if not self.state.enter():
+            return self._throttle()
+        try:
+            self._get()
+        finally:
+            self.state.leave()
+
+    def do_PUT(self):
+        if not self.state.enter():
+            return self._throttle()
+        try:
+            self._put()
+        finally:
+            self.state.leave()
+
+    def _get(self):
+        time.sleep(self.state.latency_seconds)
+        parsed = urlparse(self.path)
+        path = parsed.path[len(API_PREFIX):].lower() if parsed.path.startswith(API_PREFIX) else parsed.path.lower()
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+
+        if path == "/salelist":
+            self.state.count("salelist")
+            page = int(query.get("Page", 1))
+            limit = int(query.get("Limit", 100))
+            ordered = sorted(self.state.sales.values(), key=lambda s: s["OrderDate"], reverse=True)
+            if query.get("UpdatedSince"):
+                ordered = [s for s in ordered if s["Updated"] >= query["UpdatedSince"]]
+            chunk = ordered[(page - 1) * limit:page * limit]
+            time.sleep(self.state.row_latency_seconds * len(chunk))
+            summaries = [{k: s[k] for k in ("SaleID", "OrderNumber", "OrderDate", "Customer", "CustomerID", "Status", "Updated")}
+                         for s in chunk]
+            self._send_json(200, {"Total": len(ordered), "Page": page, "SaleList": summaries})
+        elif path == "/customer":
+            self.state.count("customer")
+            page = int(query.get("Page", 1))
+            limit = int(query.get("Limit", 100))
+            ordered = sorted(self.state.customers.values(), key=lambda c: c["Name"])
+            if query.get("ModifiedSince"):
+                ordered = [c for c in ordered if c["LastModifiedOn"] >= query["ModifiedSince"]]
+            self._send_json(200, {"Total": len(ordered), "Page": page,
+                                  "CustomerList": ordered[(page - 1) * limit:page * limit]})
+        elif path == "/sale/order":
+            self.state.count("sale_get")
+            sale = self.state.sales.get(query.get("SaleID"))
+            if sale is None:
+                self._send_json(404, {"Exception": "Sale not found"})
+                return
+            etag = '"' + hashlib.md5(json.dumps(sale, sort_keys=True).encode("utf-8")).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            else:
+                self._send_json(200, sale, etag)
+        else:
+            self._send_json(404, {"Exception": f"Unknown endpoint {parsed.path}"})
+
+    def _put(self):
+        time.sleep(self.state.latency_seconds)
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.state.count("sale_put")
+        sale = self.state.sales.get(body.get("ID"))
+        if sale is None:
+            self._send_json(400, {"Exception": "Sale not found"})
+            return
+        if sale["ID"] in self.state.locked:
+            self._send_json(400, {"Exception": f"Sale {sale['OrderNumber']} is locked and cannot be modified"})
+            return
+        sale["AdditionalAttributes"] = dict(body.get("AdditionalAttributes") or {})
+        sale["Updated"] = datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%f")
+        self._send_json(200, sale)
+
+
+def start_mock_server(sales, latency_seconds=0.0, port=0, row_latency_seconds=0.0, max_concurrent=0, locked_every=0,
+                      nameless_every=0):
+    """Start the mock API in a background thread. Returns (server, state, base_url)."""
+    state = MockDearState(sales, latency_seconds, row_latency_seconds, max_concurrent, locked_every, nameless_every)
+    handler = type("BoundMockDearHandler", (MockDearHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}{API_PREFIX}"
+    return server, state, base_url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a mock Dear Systems API for local benchmarks.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--sales", type=int, default=200)
+    parser.add_argument("--days-back", type=int, default=7)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds of latency added to every request.")
+    parser.add_argument("--row-latency", type=float, default=0.0,
+                        help="Extra /salelist latency per sale summary returned, so page size has a cost.")
+    parser.add_argument("--max-concurrent", type=int, default=0,
+                        help="Answer 429 to requests above this many in flight, like a throttled account (0 = never).")
+    parser.add_argument("--locked-every", type=int, default=0,
+                        help="Reject the PUT of every Nth sale with 400 'locked', like a voided order (0 = never).")
+    parser.add_argument("--nameless-every", type=int, default=0,
+                        help="Leave the Customer name off every Nth sale, so it must come from /customer (0 = never).")
+    args = parser.parse_args()
+
+    server, state, base_url = start_mock_server(generate_sales(args.sales, args.days_back), args.latency, args.port,
+                                                args.row_latency, args.max_concurrent, args.locked_every,
+                                                args.nameless_every)
+    print(f"Mock Dear API serving {args.sales} sales at {base_url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
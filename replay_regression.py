@@ -0,0 +1,110 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+# === REPLAY PERFORMANCE REGRESSION CHECK ===
+# Replays a recorded cassette through a sync engine with no network access and compares
+# wall time and calls per sale with a stored baseline. Exits 1 on regression, so CI can gate on it.
+#
+#   python replay_regression.py --cassette cassettes/busy_day_synthetic.jsonl \
+#       --baseline cassettes/busy_day_synthetic.baseline.json --time-scale 0.1
+#
+# Record a real day with:  python main.py --record cassettes/<name>.jsonl --from-date ... --to-date ...
+
+DEFAULT_WALL_TIME_TOLERANCE = 0.5    # allow 50% slack: CI runners are noisy
+DEFAULT_CALLS_TOLERANCE = 0.01       # call counts are deterministic under replay
+
+
+def run_replay(cassette, engine, time_scale, rate_interval):
+    # Replays never send credentials, but main.py insists they are configured
+    os.environ.setdefault("DEAR_API_KEY", "replay")
+    os.environ.setdefault("DEAR_ACCOUNT_ID", "replay")
+    os.environ["VERVE_REPLAY_TIME_SCALE"] = str(time_scale)
+
+    from verve import http_recorder
+    from verve import main
+    from verve.rate_limit import rate_limiter
+    from verve.structured_log import flush_logs
+
+    # Warm on-disk caches would skip recorded requests and skew the comparison
+    main.disable_local_state()
+    window = http_recorder.load_cassette(cassette)
+    http_recorder.REPLAY_TIME_SCALE = time_scale
+    rate_limiter.min_interval_seconds = rate_interval
+    rate_limiter.calls = 0
+
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if engine == "async":
+            from verve.async_client import run_async_sync
+
+            results = run_async_sync(window["from"], window["to"], {})
+        elif engine == "pipeline":
+            from verve.pipeline import run_pipeline_engine
+
+            results = run_pipeline_engine(window["from"], window["to"], {})
+        else:
+            results = main.run_sync_engine(window["from"], window["to"], {})
+        flush_logs()
+    wall_seconds = time.perf_counter() - started
+
+    sales = sum(results.values())
+    return {
+        "engine": engine,
+        "time_scale": time_scale,
+        "sales": sales,
+        "results": results,
+        "calls": rate_limiter.calls,
+        "calls_per_sale": round(rate_limiter.calls / sales, 4) if sales else 0.0,
+        "wall_seconds": round(wall_seconds, 3),
+    }
+
+
+def compare_to_baseline(metrics, baseline, wall_tolerance, calls_tolerance):
+    regressions = []
+    if metrics["sales"] != baseline["sales"]:
+        regressions.append(f"sales processed changed: {baseline['sales']} -> {metrics['sales']}")
+    if metrics["calls_per_sale"] > baseline["calls_per_sale"] * (1 + calls_tolerance):
+        regressions.append(f"calls per sale regressed: {baseline['calls_per_sale']} -> {metrics['calls_per_sale']}")
+    if metrics["wall_seconds"] > baseline["wall_seconds"] * (1 + wall_tolerance):
+        regressions.append(f"wall time regressed: {baseline['wall_seconds']}s -> {metrics['wall_seconds']}s "
+                           f"(tolerance {wall_tolerance:.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a recorded cassette and fail on performance regressions.")
+    parser.add_argument("--cassette", required=True)
+    parser.add_argument("--baseline", required=True, help="JSON file with the expected metrics.")
+    parser.add_argument("--engine", choices=("sync", "async", "pipeline"), default="sync")
+    parser.add_argument("--time-scale", type=float, default=0.1,
+                        help="Fraction of the recorded latency to replay (1.0 = original timing).")
+    parser.add_argument("--rate-interval", type=float, default=0.0,
+                        help="Rate limiter spacing during replay (seconds). 0 measures the engine alone.")
+    parser.add_argument("--wall-tolerance", type=float, default=DEFAULT_WALL_TIME_TOLERANCE)
+    parser.add_argument("--calls-tolerance", type=float, default=DEFAULT_CALLS_TOLERANCE)
+    parser.add_argument("--update-baseline", action="store_true", help="Write the measured metrics as the new baseline.")
+    args = parser.parse_args()
+
+    metrics = run_replay(args.cassette, args.engine, args.time_scale, args.rate_interval)
+    print(json.dumps(metrics, indent=2))
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(metrics, f, indent=2)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare_to_baseline(metrics, baseline, args.wall_tolerance, args.calls_tolerance)
+    if regressions:
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        sys.exit(1)
+    print("[OK] No performance regression against baseline.")
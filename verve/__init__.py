@@ -0,0 +1,4 @@
+# === VERVE DATE SYNC ===
+# Stamps Dear Systems sales' OrderDate into AdditionalAttribute2. Everything ships inside this
+# package so it cannot collide with other distributions' top-level modules. Importing it loads
+# nothing: `verve` (verve.cli) keeps its startup small and imports each engine only when it runs.
@@ -0,0 +1,209 @@
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+from verve.main import (
+    API_BASE_URL, dear_headers, iter_customer_pages,
+    extract_sales_in_window, get_recent_sale_details, report_sale_result, should_skip_existing_stamp, build_update_payload, handle_put_response,
+)
+from verve import http_recorder
+from verve.profiling import record_stage_time, trace_request
+from verve.rate_limit import rate_limiter
+from verve.customer_directory import customer_directory
+from verve.concurrency import CONGESTION_RETRIES, CONGESTION_STATUSES, concurrency_limiter, retry_delay_seconds
+from verve.sale_cache import sale_document_cache
+from verve.salelist_cache import salelist_cache
+from verve.page_tuner import page_size_tuner
+from verve.quarantine import sale_quarantine
+from verve.structured_log import log
+
+# === ASYNC ENGINE SETTINGS ===
+# Upper bound on sales being worked on at once. Each in-flight sale is a coroutine, not a thread,
+# so hundreds are cheap; the shared rate_limiter still decides when each call may start, and
+# concurrency_limiter how many of them may be open at once.
+ASYNC_MAX_IN_FLIGHT = int(os.getenv("VERVE_ASYNC_MAX_IN_FLIGHT", "200"))
+ASYNC_REQUEST_TIMEOUT_SECONDS = 60
+
+
+def create_async_client(max_in_flight=ASYNC_MAX_IN_FLIGHT):
+    return httpx.AsyncClient(
+        headers=dear_headers(),
+        verify=False,
+        timeout=ASYNC_REQUEST_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight),
+    )
+
+
+# Async counterpart of main.send_dear_request. Stage times are recorded per call rather than
+# with profiling.stage(), because many coroutines are inside the same stage at once.
+async def send_dear_request_async(client, method, url, endpoint, sale_id=None, **kwargs):
+    for retries in range(CONGESTION_RETRIES + 1):
+        started = time.perf_counter()
+        await rate_limiter.wait_async()
+        record_stage_time("rate_wait", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await concurrency_limiter.acquire_async()
+        record_stage_time("concurrency_wait", time.perf_counter() - started)
+
+        started = time.perf_counter()
+        try:
+            try:
+                if http_recorder.replaying():
+                    response = await http_recorder.replay_async(method, url, kwargs.get("params"), kwargs.get("json"))
+                else:
+                    response = await client.request(method, url, **kwargs)
+            except Exception as e:
+                concurrency_limiter.observe(endpoint, time.perf_counter() - started, error=e)
+                raise
+            elapsed = time.perf_counter() - started
+            concurrency_limiter.observe(endpoint, elapsed, response.status_code)
+        finally:
+            concurrency_limiter.release()
+        if http_recorder.recording():
+            http_recorder.record_exchange(method, url, kwargs.get("params"), kwargs.get("json"),
+                                          response.status_code, response.text, elapsed)
+        record_stage_time(endpoint, elapsed)
+        if response.status_code not in CONGESTION_STATUSES or retries == CONGESTION_RETRIES:
+            break
+        log.debug("%s returned %s, retrying (%d/%d)", endpoint, response.status_code, retries + 1, CONGESTION_RETRIES)
+        await asyncio.sleep(retry_delay_seconds(response))
+    payload_bytes = len(response.content) + len(response.request.content or b"")
+    trace_request(endpoint, elapsed, response.status_code, sale_id=sale_id, payload_bytes=payload_bytes, retries=retries)
+    return response
+
+
+# === STEP 1 (async): GET ALL SALE IDS with Pagination ===
+async def get_recent_sale_details_async(client, from_date_str, to_date_str):
+    url = f"{API_BASE_URL}/salelist"
+    all_extracted_details = []
+    page = 1
+
+    from_date = datetime.strptime(from_date_str, "%Y-%m-%d")
+    to_date = datetime.strptime(to_date_str, "%Y-%m-%d") + timedelta(days=1)  # Include the entire end day
+
+    log.info(f"Fetching sales from {from_date_str} to {to_date_str} with pagination (async)...")
+    page_size, reason = page_size_tuner.choose()
+    log.info(f"SaleList page size {page_size}: {reason}")
+
+    try:
+        while True:
+            params = {"Page": page, "Limit": page_size}
+            log.info(f"Fetching page {page} with limit {page_size}...", extra={"sample": "salelist_page"})
+            response = await send_dear_request_async(client, "GET", url, "salelist", params=params)
+
+            if response.status_code != 200:
+                log.error(f"Failed to fetch sale list on page {page}: {response.text}")
+                return all_extracted_details
+
+            sales_from_list = response.json().get("SaleList", [])
+            page_size_tuner.observe(page_size, len(sales_from_list), response.elapsed.total_seconds(),
+                                    len(response.content))
+            if not sales_from_list:
+                log.info(f"No more sales found on page {page}. End of pagination.")
+                break
+
+            all_extracted_details.extend(extract_sales_in_window(sales_from_list, from_date, to_date))
+            page += 1
+    finally:
+        page_size_tuner.finish_listing(page_size)
+
+    log.info(f"Found {len(all_extracted_details)} sales within the specified date range.")
+    return all_extracted_details
+
+
+# Async counterpart of main.fetch_sale_document: same cache rules, same return shape.
+async def fetch_sale_document_async(client, essential_sale_details):
+    sale_id = essential_sale_details["SaleID"]
+    list_updated = essential_sale_details.get("Updated")
+    cached = sale_document_cache.get(sale_id)
+    if sale_document_cache.is_fresh_for_listing(cached, list_updated):
+        sale_document_cache.count("fresh_hits")
+        return json.loads(cached["body"]), None
+
+    response = await send_dear_request_async(client, "GET", f"{API_BASE_URL}/sale/order", "sale_get",
+                                             sale_id=sale_id, params={"SaleID": sale_id},
+                                             headers=sale_document_cache.conditional_headers(cached))
+    if response.status_code == 304 and cached:
+        sale_document_cache.count("not_modified")
+        sale_document_cache.refresh_listing_timestamp(sale_id, cached, list_updated)
+        return json.loads(cached["body"]), None
+    if response.status_code != 200:
+        sale_quarantine.record_failure(essential_sale_details, "sale_get", response.status_code, response.text)
+        return None, f"{response.status_code} - {response.text}"
+
+    sale_document_cache.count("misses")
+    sale_document_cache.store(sale_id, response.text, response.headers, list_updated)
+    return response.json(), None
+
+
+# === STEP 2 (async): UPDATE AdditionalAttributes.OrderDate ===
+# Same decisions and return values as main.update_order_date_for_sale.
+async def update_order_date_for_sale_async(client, essential_sale_details, stamp_cache=None, overwrite_mismatched=False):
+    sale_id = essential_sale_details["SaleID"]
+    order_number = essential_sale_details.get("OrderNumber", "N/A")
+    if sale_quarantine.holds(essential_sale_details):
+        return "skipped"
+
+    try:
+        log.debug("Processing SaleID: %s, OrderNumber: %s", sale_id, order_number)
+        detailed_sale_data, error = await fetch_sale_document_async(client, essential_sale_details)
+
+        if detailed_sale_data is None:
+            log.error(f"GET sale {sale_id} failed: {error}")
+            return "failed"
+
+        if should_skip_existing_stamp(essential_sale_details, detailed_sale_data, stamp_cache, overwrite_mismatched):
+            return "skipped"
+
+        sale_data_for_put, formatted_date_for_attr = build_update_payload(essential_sale_details, detailed_sale_data)
+        if sale_data_for_put is None:
+            log.error(formatted_date_for_attr)
+            return "failed"
+
+        put_response = await send_dear_request_async(client, "PUT", f"{API_BASE_URL}/sale", "sale_put",
+                                                     sale_id=sale_id, json=sale_data_for_put)
+        return handle_put_response(essential_sale_details, put_response, sale_data_for_put, formatted_date_for_attr, stamp_cache)
+    except Exception as e:
+        log.error(f"Sale {sale_id} (Order {order_number}) failed: {e}")
+        return "failed"
+
+
+async def update_sales_async(client, sale_details, stamp_cache=None, max_in_flight=ASYNC_MAX_IN_FLIGHT,
+                             overwrite_mismatched=False):
+    semaphore = asyncio.Semaphore(max_in_flight)
+
+    async def worker(sale_detail):
+        async with semaphore:
+            status = await update_order_date_for_sale_async(client, sale_detail, stamp_cache, overwrite_mismatched)
+        report_sale_result(sale_detail, status, stamp_cache)
+        return status
+
+    statuses = await asyncio.gather(*(worker(sale) for sale in sale_details))
+    results = {"updated": 0, "skipped": 0, "failed": 0}
+    for status in statuses:
+        results[status] += 1
+    return results
+
+
+async def sync_window_async(from_str, to_str, stamp_cache=None, max_in_flight=ASYNC_MAX_IN_FLIGHT):
+    async with create_async_client(max_in_flight) as client:
+        if salelist_cache.enabled:
+            # The day cache is file-based and mostly avoids the network; run it off the event loop
+            sale_details = await asyncio.to_thread(get_recent_sale_details, from_str, to_str)
+        else:
+            sale_details = await get_recent_sale_details_async(client, from_str, to_str)
+        log.info(f"Found {len(sale_details)} sales in the selected date range.")
+        # A /customer refresh pages through the blocking send_dear_request: do it off the loop, before
+        # any sale coroutine holds a concurrency slot
+        await asyncio.to_thread(customer_directory.prepare, sale_details, iter_customer_pages)
+        return await update_sales_async(client, sale_details, stamp_cache, max_in_flight)
+
+
+def run_async_sync(from_str, to_str, stamp_cache=None, max_in_flight=ASYNC_MAX_IN_FLIGHT):
+    """Blocking entry point: runs the whole window on a single event loop."""
+    return asyncio.run(sync_window_async(from_str, to_str, stamp_cache, max_in_flight))
@@ -0,0 +1,60 @@
+from verve.customer_directory import customer_directory
+from verve.main import get_recent_sale_details, iter_customer_pages, report_sale_result, update_order_date_for_sale
+from verve.decision_kernel import IN_WINDOW_BUCKETS, classify_sales
+from verve.stamp_cache import parse_stamp_date
+from verve.structured_log import flush_logs, log
+
+# === STAMP AUDIT ===
+# Compares AdditionalAttribute2 against OrderDate for every sale in a window using the
+# local stamp cache, so only sales that actually need a fix cost a GET + PUT.
+
+def classify_sales_against_cache(sale_details, stamp_cache):
+    """Split SaleList entries into matched / mismatched / unstamped / unknown buckets."""
+    buckets = classify_sales(sale_details, stamp_cache=stamp_cache)
+    return {bucket: [sale_details[i] for i in buckets[bucket]] for bucket in IN_WINDOW_BUCKETS}
+
+
+def print_audit_report(report, results=None):
+    total = sum(len(sales) for sales in report.values())
+    print("\n=== AUDIT SUMMARY ===")
+    print(f"  Sales checked:  {total}")
+    print(f"  Matched:        {len(report['matched'])}")
+    print(f"  Mismatched:     {len(report['mismatched'])}")
+    print(f"  Unstamped:      {len(report['unstamped'])}")
+    print(f"  Not in cache:   {len(report['unknown'])}")
+    for sale in report["mismatched"]:
+        stamped = sale.get("_StampedValue")
+        parsed = parse_stamp_date(stamped)
+        note = "" if parsed else " (unparseable)"
+        print(f"    MISMATCH SaleID {sale['SaleID']} (Order {sale.get('OrderNumber', 'N/A')}): "
+              f"stamped '{stamped}'{note}, OrderDate {sale.get('OrderDate')}")
+    if results is not None:
+        print(f"  Fix results:    {results.get('updated', 0)} updated, "
+              f"{results.get('skipped', 0)} skipped, {results.get('failed', 0)} failed")
+
+
+def run_audit(from_str, to_str, stamp_cache, fix=True, include_unknown=False):
+    sale_details = get_recent_sale_details(from_str, to_str)
+    report = classify_sales_against_cache(sale_details, stamp_cache)
+    for sale in report["mismatched"]:
+        sale["_StampedValue"] = stamp_cache[sale["SaleID"]].get("AdditionalAttribute2")
+
+    # The minimal work list: known-bad stamps, known-empty stamps and, if asked, sales we have never seen
+    work_list = report["mismatched"] + report["unstamped"]
+    if include_unknown:
+        work_list += report["unknown"]
+
+    results = None
+    if fix and work_list:
+        log.info(f"Handing {len(work_list)} sales to the update pipeline...")
+        customer_directory.prepare(work_list, iter_customer_pages)
+        results = {"updated": 0, "skipped": 0, "failed": 0}
+        for sale in work_list:
+            essential = {k: v for k, v in sale.items() if not k.startswith("_")}
+            status = update_order_date_for_sale(essential, stamp_cache=stamp_cache, overwrite_mismatched=True)
+            results[status] = results.get(status, 0) + 1
+            report_sale_result(essential, status, stamp_cache)
+
+    flush_logs()
+    print_audit_report(report, results)
+    return report, results
@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from verve.state_snapshot import read_state
+from verve.structured_log import log
+
+# === LOCAL CHANGE FEED ===
+# Other jobs that want to know which orders changed used to poll /salelist themselves, spending
+# the same per-account rate limit the sync needs. The sync already pays for that data, so it
+# publishes it as events:
+#
+#   listed   a SaleList summary whose (SaleID, Updated) the feed has not published before
+#   stamped  a sale this run PUT AdditionalAttribute2 on (with the value written)
+#
+# Events go to an append-only JSONL file (--change-feed / VERVE_CHANGE_FEED_FILE) and, optionally,
+# to a Unix socket a consumer listens on (--change-feed-socket / VERVE_CHANGE_FEED_SOCKET). Each
+# event carries its "offset": the byte position of its line in the file. A consumer keeps the
+# offset after the last event it handled and resumes from there with read_events() (or
+# `verve feed --from-offset N --follow`), which is a seek and a read, not an API call.
+#
+# Published listed events are remembered in <file>.seen, 8 bytes per (SaleID, Updated), so a sale
+# backfilled into an old window or edited with a clock-skewed "Updated" is still published once,
+# which a single "newest Updated" watermark would suppress. The newest SEEN_MAX_ENTRIES are kept;
+# a sale older than that which is listed again is published again. Delivery is at-least-once, so a
+# consumer should treat (SaleID, Updated) as the identity of a listed event.
+#
+# The socket is best effort and written from its own thread, so a slow consumer never stalls the
+# sync (or the async engine's event loop): if nobody is listening or the consumer stops reading,
+# it is dropped for the rest of the run and the file still has everything. One writer per file.
+
+CHANGE_FEED_FILE = os.getenv("VERVE_CHANGE_FEED_FILE")
+CHANGE_FEED_SOCKET = os.getenv("VERVE_CHANGE_FEED_SOCKET")
+SOCKET_TIMEOUT_SECONDS = 0.5
+SOCKET_CLOSE_WAIT_SECONDS = 5.0  # how long close() lets the writer thread drain
+SEEN_MAX_ENTRIES = 500_000  # 4 MB of .seen
+SUMMARY_FIELDS = ("SaleID", "OrderNumber", "OrderDate", "Customer", "CustomerID", "Status", "Updated")
+
+
+class ChangeFeed:
+    def __init__(self, path=CHANGE_FEED_FILE, socket_path=CHANGE_FEED_SOCKET):
+        self.path = path
+        self.socket_path = socket_path
+        self._lock = threading.Lock()
+        self._file = None
+        self._offset = 0
+        self._socket = None
+        self._socket_failed = False
+        self._socket_queue = None
+        self._socket_thread = None
+        self._seen = None  # keys of every (SaleID, Updated) published as listed
+        self._seen_order = array("Q")  # the same keys, oldest first
+        self._seen_saved = 0  # how many of _seen_order are already in the .seen file
+        self.stats = {"listed": 0, "stamped": 0}
+
+    @property
+    def enabled(self):
+        return bool(self.path or self.socket_path)
+
+    @property
+    def seen_path(self):
+        return f"{self.path}.seen"
+
+    # --- publishing ---
+
+    def publish_listed(self, sales):
+        """Publish the SaleList summaries of one page that changed since they were last published."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._seen is None:
+                self._load_seen()
+            now = datetime.now().isoformat(timespec="seconds")
+            events = []
+            for sale in sales:
+                sale_id = sale.get("SaleID")
+                if not sale_id:
+                    continue
+                key = seen_key(sale_id, sale.get("Updated"))
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+                self._seen_order.append(key)
+                events.append({"event": "listed", "at": now, **{field: sale.get(field) for field in SUMMARY_FIELDS}})
+            self._write(events)
+            self.stats["listed"] += len(events)
+
+    def publish_stamped(self, sale, stamp):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._write([{"event": "stamped", "at": datetime.now().isoformat(timespec="seconds"),
+                          **{field: sale.get(field) for field in SUMMARY_FIELDS if field in sale},
+                          "AdditionalAttribute2": stamp}])
+            self.stats["stamped"] += 1
+
+    def _write(self, events):
+        if not events:
+            return
+        lines = []
+        if self.path and self._file is None:
+            self._file = open(self.path, "ab")
+            self._offset = self._file.seek(0, os.SEEK_END)
+        for event in events:
+            line = json.dumps({"offset": self._offset, **event}, separators=(",", ":")).encode("utf-8") + b"\n"
+            lines.append(line)
+            self._offset += len(line)
+        data = b"".join(lines)
+        if self._file is not None:
+            self._file.write(data)
+            self._file.flush()
+        if self.socket_path and not self._socket_failed:
+            if self._socket_thread is None:
+                self._socket_queue = queue.SimpleQueue()
+                self._socket_thread = threading.Thread(target=self._socket_writer, name="change-feed-socket",
+                                                       daemon=True)
+                self._socket_thread.start()
+            self._socket_queue.put(data)
+
+    def _socket_writer(self):
+        while (data := self._socket_queue.get()) is not None:
+            if self._socket_failed:
+                continue  # keep draining so close() is not left waiting
+            try:
+                if self._socket is None:
+                    self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                    self._socket.settimeout(SOCKET_TIMEOUT_SECONDS)
+                    self._socket.connect(self.socket_path)
+                self._socket.sendall(data)
+            except (OSError, AttributeError) as e:  # AttributeError: no AF_UNIX on this platform
+                log.warning(f"[CHANGE FEED] Socket {self.socket_path} unavailable ({e}); events go to the file only.")
+                self._socket_failed = True
+                if self._socket is not None:
+                    self._socket.close()
+                    self._socket = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    # --- published (SaleID, Updated) ---
+
+    def _load_seen(self):
+        self._seen_order = array("Q")
+        if self.path:
+            data = read_state(self.seen_path) or b""
+            self._seen_order.frombytes(data[:len(data) - len(data) % self._seen_order.itemsize])
+        self._seen_saved = len(self._seen_order)
+        self._seen = set(self._seen_order)
+
+    def _save_seen(self):
+        if not self.path or self._seen is None or self._seen_saved == len(self._seen_order):
+            return
+        if len(self._seen_order) > SEEN_MAX_ENTRIES or not os.path.exists(self.seen_path):
+            del self._seen_order[:-SEEN_MAX_ENTRIES]
+            self._seen = set(self._seen_order)
+            tmp_path = f"{self.seen_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                self._seen_order.tofile(f)
+            os.replace(tmp_path, self.seen_path)
+        else:
+            with open(self.seen_path, "ab") as f:
+                self._seen_order[self._seen_saved:].tofile(f)
+        self._seen_saved = len(self._seen_order)
+
+    def close(self):
+        """Record what was published, let the socket writer drain and release the file and socket."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._save_seen()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            thread, self._socket_thread = self._socket_thread, None
+            if thread is not None:
+                self._socket_queue.put(None)
+        if thread is not None:
+            thread.join(SOCKET_CLOSE_WAIT_SECONDS)
+            if thread.is_alive():
+                log.warning(f"[CHANGE FEED] Socket {self.socket_path} still busy after "
+                            f"{SOCKET_CLOSE_WAIT_SECONDS:.0f}s; unsent events are in the file only.")
+
+
+def seen_key(sale_id, updated):
+    """(SaleID, Updated) as the 64-bit key kept in the .seen file."""
+    digest = hashlib.blake2b(f"{sale_id}|{updated or ''}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+# --- consuming ---
+
+def read_events(path, offset=0, limit=None):
+    """Complete events from byte offset on. Returns (events, next_offset) to resume from."""
+    events = []
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return events, offset
+    with f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break  # the writer is mid-line: pick it up next time
+            events.append(json.loads(line))
+            offset += len(line)
+            if limit and len(events) >= limit:
+                break
+    return events, offset
+
+
+def follow_events(path, offset=0, poll_seconds=1.0):
+    """Yield events from offset on as they are appended, forever."""
+    while True:
+        events, offset = read_events(path, offset)
+        yield from events
+        if not events:
+            time.sleep(poll_seconds)
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,333 @@
+import sys
+
+# === VERVE COMMAND LINE ===
+# Single entry point installed as `verve` (see pyproject.toml):
+#   verve sync     [main.py options]           stamp a window (what `python main.py` does)
+#   verve backfill --from-date D [--chunk-days N] [main.py options]
+#                                               a long range, one window of N days at a time
+#   verve lookup   SALE_ID|ORDER_NUMBER [--remote]
+#                                               what we know about one sale, from local state only
+#                                               unless --remote (one or two API calls)
+#   verve audit    [main.py options]           same as `python main.py --audit`
+#   verve quarantine [--release ID ...|--release-all] [--json]
+#                                               sales held back after permanent failures
+#   verve stamped  [--compact] [--import-stamp-cache]
+#                                               size of the compact stamped-SaleID set
+#   verve snapshot save|restore|info            the warm-start state snapshot CI carries between runs
+#   verve freshness [--runs N] [--days]         order-to-stamp latency and unstamped backlog per run
+#   verve feed FILE [--from-offset N] [--follow]
+#                                               read the local change feed of listed and stamped sales
+#
+# Startup is kept small for cron runs and one-off lookups: nothing heavy is imported here,
+# main.py only loads `requests` on its first API call and resolves credentials at that point,
+# and `verve lookup` without --remote never imports main at all. bench_startup.py measures it.
+
+__version__ = "0.1.0"
+
+USAGE = """usage: verve [--version] <command> [options]
+
+commands:
+  sync       Stamp OrderDate into AdditionalAttribute2 for a window (default: today)
+  backfill   Stamp a long date range in windows of --chunk-days days
+  lookup     Show the cached state of one sale by SaleID or order number
+  audit      Check cached stamps against OrderDate and fix only what needs it
+  quarantine List sales held back after permanent failures, or release them
+  stamped    Report, compact or seed the compact set of SaleIDs known to be stamped
+  snapshot   Save, restore or describe the warm-start state snapshot
+  freshness  Order-to-stamp latency percentiles and unstamped backlog, run by run
+  feed       Print events from the local change feed, optionally following it
+
+Run `verve <command> --help` for the options of a command."""
+
+
+def cmd_sync(argv):
+    from verve import main
+    main.run_cli(argv, prog="verve sync")
+    return 0
+
+
+def cmd_audit(argv):
+    from verve import main
+    args = main.parse_args(["--audit", *argv], prog="verve audit")
+    main.run(args)
+    return 0
+
+
+def cmd_backfill(argv):
+    from datetime import datetime, timedelta
+
+    from verve import main
+    parser = main.build_parser(prog="verve backfill",
+                               description="Stamp a long date range, one window of --chunk-days days at a time. "
+                                           "Progress is saved after every window, so an interrupted backfill "
+                                           "can simply be started again.")
+    parser.add_argument("--chunk-days", type=int, default=7, help="Days per window (default 7).")
+    parser.set_defaults(engine="pipeline")
+    args = parser.parse_args(argv)
+    if not args.from_date:
+        parser.error("--from-date is required")
+    if args.record or args.replay or args.plan or args.audit:
+        parser.error("backfill cannot be combined with --record, --replay, --plan or --audit")
+    if args.chunk_days < 1:
+        parser.error("--chunk-days must be at least 1")
+
+    first = datetime.strptime(args.from_date, "%Y-%m-%d")
+    last = datetime.strptime(args.to_date, "%Y-%m-%d") if args.to_date else datetime.today()
+    windows = []
+    while first <= last:
+        window_end = min(first + timedelta(days=args.chunk_days - 1), last)
+        windows.append((first.strftime("%Y-%m-%d"), window_end.strftime("%Y-%m-%d")))
+        first = window_end + timedelta(days=1)
+
+    totals = {"updated": 0, "skipped": 0, "failed": 0}
+    for i, (from_str, to_str) in enumerate(windows, 1):
+        print(f"\n=== BACKFILL WINDOW {i}/{len(windows)}: {from_str} to {to_str} ===")
+        args.from_date, args.to_date = from_str, to_str
+        results = main.run(args) or {}
+        for status, count in results.items():
+            totals[status] = totals.get(status, 0) + count
+    print(f"\nBackfill finished: {len(windows)} windows, {totals['updated']} updated, "
+          f"{totals['skipped']} skipped, {totals['failed']} failed.")
+    return 0
+
+
+def cmd_lookup(argv):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="verve lookup",
+                                     description="Show the stamp cache, quarantine, SaleList cache and sale cache "
+                                                 "entries for one sale.")
+    parser.add_argument("sale", help="SaleID, or an order number such as SO-00042.")
+    parser.add_argument("--remote", action="store_true",
+                        help="Also fetch the live /sale/order document (needs credentials; 1-2 API calls).")
+    args = parser.parse_args(argv)
+
+    from verve.quarantine import sale_quarantine
+    from verve.sale_cache import sale_document_cache
+    from verve.salelist_cache import salelist_cache
+    from verve.stamp_cache import load_stamp_cache
+    from verve.stamped_set import stamped_sales
+
+    is_sale_id = len(args.sale) == 36 and args.sale.count("-") == 4
+    summary = salelist_cache.find(sale_id=args.sale) if is_sale_id else salelist_cache.find(order_number=args.sale)
+    sale_id = args.sale if is_sale_id else (summary or {}).get("SaleID")
+    found = {"query": args.sale, "sale_id": sale_id, "salelist": summary,
+             "stamp": load_stamp_cache().get(sale_id) if sale_id else None,
+             "quarantine": next((entry for entry in sale_quarantine.report() if entry["SaleID"] == sale_id), None),
+             "in_stamped_set": stamped_sales.knows(sale_id) if sale_id else False}
+
+    cached = sale_document_cache.get(sale_id) if sale_id else None
+    if cached:
+        document = json.loads(cached["body"])
+        found["sale_cache"] = {
+            "fetched_for_listing": cached.get("list_updated"),
+            "OrderDate": document.get("OrderDate"),
+            "Customer": document.get("Customer"),
+            "CustomerID": document.get("CustomerID"),
+            "Status": document.get("Status"),
+            "AdditionalAttribute2": (document.get("AdditionalAttributes") or {}).get("AdditionalAttribute2"),
+        }
+
+    if args.remote:
+        from verve import main
+        if not sale_id:
+            response = main.send_dear_request("GET", f"{main.API_BASE_URL}/salelist", "salelist",
+                                              params={"Page": 1, "Limit": 10, "Search": args.sale})
+            matches = [s for s in response.json().get("SaleList", []) if s.get("OrderNumber") == args.sale] \
+                if response.status_code == 200 else []
+            sale_id = found["sale_id"] = matches[0]["SaleID"] if matches else None
+        if sale_id:
+            document, error = main.fetch_sale_document({"SaleID": sale_id})
+            found["remote"] = {"error": error} if document is None else {
+                "OrderDate": document.get("OrderDate"),
+                "Customer": document.get("Customer"),
+                "Status": document.get("Status"),
+                "AdditionalAttribute2": (document.get("AdditionalAttributes") or {}).get("AdditionalAttribute2"),
+            }
+            main.flush_logs()
+
+    print(json.dumps(found, indent=2))
+    return 0 if sale_id else 1
+
+
+def cmd_quarantine(argv):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="verve quarantine",
+                                     description="Report sales quarantined after permanent failures. Release a sale "
+                                                 "once it has been fixed in Dear, so the next run updates it.")
+    parser.add_argument("--release", nargs="+", metavar="SALE_ID", default=[],
+                        help="Release these SaleIDs (or order numbers).")
+    parser.add_argument("--release-all", action="store_true", help="Release every quarantined sale.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args(argv)
+
+    from verve.quarantine import print_quarantine_report, sale_quarantine
+    from verve.structured_log import flush_logs
+
+    entries = sale_quarantine.report()
+    if args.release or args.release_all:
+        by_order = {entry.get("order"): entry["SaleID"] for entry in entries}
+        wanted = [entry["SaleID"] for entry in entries] if args.release_all else \
+            [by_order.get(key, key) for key in args.release]
+        missing = [key for key in wanted if not sale_quarantine.release(key, "released by hand")]
+        sale_quarantine.save()
+        flush_logs()
+        print(f"Released {len(wanted) - len(missing)} sales.")
+        if missing:
+            print(f"Not in quarantine: {', '.join(missing)}")
+            return 1
+        return 0
+
+    if args.json:
+        print(json.dumps(entries, indent=2))
+    else:
+        print_quarantine_report(entries)
+    return 0
+
+
+def cmd_stamped(argv):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="verve stamped",
+                                     description="Report the compact set of SaleIDs known to carry a stamp. Runs "
+                                                 "append to it and compact it as it grows.")
+    parser.add_argument("--compact", action="store_true", help="Merge the append log into the sorted file now.")
+    parser.add_argument("--import-stamp-cache", action="store_true",
+                        help="Add every sale the stamp cache has seen stamped (e.g. when starting the set).")
+    args = parser.parse_args(argv)
+
+    from verve.stamped_set import stamped_sales
+
+    if args.import_stamp_cache:
+        from verve.stamp_cache import load_stamp_cache
+
+        before = len(stamped_sales)
+        for sale_id, entry in load_stamp_cache().items():
+            if str(entry.get("AdditionalAttribute2") or "").strip():
+                stamped_sales.add(sale_id)
+        print(f"Imported {len(stamped_sales) - before} SaleIDs from the stamp cache.")
+    stamped_sales.save(compact=True if args.compact else None)
+    print(json.dumps(stamped_sales.report(), indent=2))
+    return 0
+
+
+def cmd_snapshot(argv):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="verve snapshot",
+                                     description="Pack every piece of local sync state into one versioned file "
+                                                 "(save), write its members back out as files (restore), or list "
+                                                 "it (info). Runs read the snapshot in place, so restore is only "
+                                                 "needed to inspect or edit the files by hand.")
+    parser.add_argument("action", choices=("save", "restore", "info"))
+    args = parser.parse_args(argv)
+
+    from verve.state_snapshot import save_snapshot, snapshot
+
+    if args.action == "save":
+        from verve.stamped_set import stamped_sales
+
+        # Fold the stamped set's append log in, so the next run maps one sorted file
+        stamped_sales.save(compact=True)
+        members = save_snapshot()
+        print(f"Saved {len(members)} files ({sum(members.values()) / 1024:.0f} KB) to {snapshot.path}.")
+    elif args.action == "restore":
+        written = snapshot.restore()
+        print(f"Restored {len(written)} files from {snapshot.path}.")
+    else:
+        snapshot.view("")  # opens it
+        if not snapshot.members:
+            print(f"No usable snapshot at {snapshot.path}.")
+            return 1
+        print(f"{snapshot.path}: created {snapshot.created}, {len(snapshot.members)} files")
+        for path, (_, length) in sorted(snapshot.members.items()):
+            print(f"  {length:>12,}  {path}")
+    return 0
+
+
+def cmd_freshness(argv):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="verve freshness",
+                                     description="How long after OrderDate sales got their stamp, and how many were "
+                                                 "still unstamped, for each recorded run.")
+    parser.add_argument("--runs", type=int, default=20, help="How many recent runs to show (default 20, 0 = all).")
+    parser.add_argument("--days", action="store_true", help="Also break the latest run down by order day.")
+    parser.add_argument("--json", action="store_true", help="Print the records as JSON.")
+    args = parser.parse_args(argv)
+
+    from verve.freshness import freshness, print_freshness_history
+
+    records = freshness.history(args.runs)
+    if args.json:
+        print(json.dumps(records, indent=2))
+    else:
+        print_freshness_history(records, days=args.days)
+    return 0
+
+
+def cmd_feed(argv):
+    import argparse
+    import json
+    import os
+
+    parser = argparse.ArgumentParser(prog="verve feed",
+                                     description="Print change-feed events (one JSON object per line) from a byte "
+                                                 "offset on. Keep the offset printed at the end to resume there.")
+    parser.add_argument("file", nargs="?", default=os.getenv("VERVE_CHANGE_FEED_FILE"),
+                        help="The feed file (default VERVE_CHANGE_FEED_FILE).")
+    parser.add_argument("--from-offset", type=int, default=0, help="Byte offset to start from (default 0).")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many events.")
+    parser.add_argument("--event", choices=("listed", "stamped"), default=None, help="Only print this kind of event.")
+    parser.add_argument("--follow", action="store_true", help="Keep printing events as runs append them.")
+    args = parser.parse_args(argv)
+    if not args.file:
+        parser.error("no feed file given and VERVE_CHANGE_FEED_FILE is not set")
+
+    from verve.change_feed import follow_events, read_events
+
+    def emit(event):
+        if args.event is None or event["event"] == args.event:
+            print(json.dumps(event, separators=(",", ":")), flush=True)
+
+    if args.follow:
+        try:
+            for event in follow_events(args.file, args.from_offset):
+                emit(event)
+        except KeyboardInterrupt:
+            pass
+        return 0
+    events, next_offset = read_events(args.file, args.from_offset, args.limit)
+    for event in events:
+        emit(event)
+    print(f"next offset: {next_offset}", file=sys.stderr)
+    return 0
+
+
+COMMANDS = {"sync": cmd_sync, "backfill": cmd_backfill, "lookup": cmd_lookup, "audit": cmd_audit,
+            "quarantine": cmd_quarantine, "stamped": cmd_stamped, "snapshot": cmd_snapshot,
+            "freshness": cmd_freshness, "feed": cmd_feed}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] in ("-h", "--help"):
+        print(USAGE)
+        return 0 if argv else 2
+    if argv[0] == "--version":
+        print(f"verve {__version__}")
+        return 0
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(f"verve: unknown command '{argv[0]}'\n\n{USAGE}", file=sys.stderr)
+        return 2
+    return command(argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
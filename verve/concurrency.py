@@ -0,0 +1,224 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from verve.structured_log import log
+
+# === ADAPTIVE CONCURRENCY (AIMD) ===
+# How many Dear requests may be in flight at once. rate_limiter spaces the *start* of calls; this
+# bounds how many are open together, and moves that bound with what the API tells us:
+#   * every healthy response adds 1/limit (about +1 per round trip of the whole window), and during
+#     slow start +1, so the limit doubles per round trip until the first sign of congestion;
+#   * a 429, a 5xx gateway/overload status, a timeout or connection error, or a latency spike (the
+#     endpoint's latency average above LATENCY_SPIKE_FACTOR x its healthy baseline) multiplies the
+#     limit by DECREASE_FACTOR, at most once per round trip so one burst is not punished N times.
+# The limit only grows while it is actually used, so a run held back by the rate limiter (or by a
+# single-threaded engine) does not talk itself into a limit it never tested.
+#
+# Every change is kept (see report()) and goes into last_run_metrics.json and the run summary.
+# The next run starts from the limit this one ended on (warm_start), instead of slow-starting again.
+# A throttled call is retried (CONGESTION_RETRIES, after Retry-After if the API sends one), so
+# probing for a higher limit costs a little time, not a failed sale.
+# VERVE_ADAPTIVE_CONCURRENCY=0 turns the controller into a pass-through.
+# acquire() blocks its thread, so it refuses to run on an event loop: coroutines waiting there for
+# a slot held by other suspended coroutines would never be woken. Async code uses acquire_async().
+
+CONCURRENCY_ENABLED = os.getenv("VERVE_ADAPTIVE_CONCURRENCY", "1") != "0"
+CONCURRENCY_INITIAL = int(os.getenv("VERVE_CONCURRENCY_INITIAL", "2"))
+CONCURRENCY_MIN = 1
+CONCURRENCY_MAX = int(os.getenv("VERVE_CONCURRENCY_MAX", "32"))
+DECREASE_FACTOR = 0.5
+LATENCY_SPIKE_FACTOR = 2.0
+LATENCY_SPIKE_FLOOR_SECONDS = 0.05  # spikes smaller than this in absolute terms are jitter, not congestion
+BASELINE_DRIFT = 0.01               # the healthy baseline may rise 1% per response, to follow the API through the day
+EWMA_WEIGHT = 0.2
+CONGESTION_STATUSES = {429: "429", 502: "5xx", 503: "5xx", 504: "5xx"}
+CONGESTION_RETRIES = 3
+MAX_RETRY_AFTER_SECONDS = 60
+MAX_DECISIONS_KEPT = 200
+
+
+def _on_event_loop():
+    # Only asks asyncio if something imported it: the sync engines never do
+    asyncio = sys.modules.get("asyncio")
+    return asyncio is not None and asyncio._get_running_loop() is not None
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on in-flight requests, shared by threads (acquire) and coroutines (acquire_async)."""
+
+    def __init__(self, initial=CONCURRENCY_INITIAL, minimum=CONCURRENCY_MIN, maximum=CONCURRENCY_MAX,
+                 enabled=CONCURRENCY_ENABLED):
+        self.minimum = minimum
+        self.maximum = max(maximum, minimum)
+        self.initial = min(max(initial, minimum), self.maximum)
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.limit = float(self.initial)
+            self.slow_start = True
+            self.in_flight = 0
+            self._waiters = deque()       # callables that hand a freed slot to a blocked caller
+            self._latency = {}            # endpoint -> {"ewma": s, "baseline": s}
+            self._last_decrease = 0.0
+            self._started = time.monotonic()
+            self.peak_in_flight = 0
+            self.peak_limit = self.limit
+            self.low_limit = self.limit
+            self.responses = 0
+            self.increases = 0
+            self.decreases = {}           # reason -> count
+            self.decisions = []           # {"t", "limit", "reason"} for every change of the whole number
+
+    def warm_start(self, limit):
+        """Start from a previous run's final limit, growing additively from there. Ignored if not above initial."""
+        if not limit or int(limit) <= self.initial:
+            return
+        with self._lock:
+            self.initial = min(int(limit), self.maximum)
+            self.limit = self.peak_limit = self.low_limit = float(self.initial)
+            self.slow_start = False
+
+    # --- slots ---
+
+    def _take(self):
+        if self.in_flight < int(self.limit):
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return True
+        return False
+
+    def _hand_out(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            self._take()
+            self._waiters.popleft()()
+
+    def acquire(self):
+        if not self.enabled:
+            return
+        if _on_event_loop():
+            raise RuntimeError("blocking concurrency acquire on an event loop thread; use acquire_async "
+                               "or move the call off the loop with asyncio.to_thread")
+        with self._lock:
+            if self._take():
+                return
+            granted = threading.Event()
+            self._waiters.append(granted.set)
+        granted.wait()
+
+    async def acquire_async(self):
+        if not self.enabled:
+            return
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+        with self._lock:
+            if self._take():
+                return
+            self._waiters.append(lambda: loop.call_soon_threadsafe(self._grant, granted))
+        try:
+            await granted
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before the cancellation; give it back
+            if granted.done() and not granted.cancelled():
+                self.release()
+            raise
+
+    def _grant(self, future):
+        if future.cancelled():
+            self.release()  # the waiter gave up before its slot arrived
+        else:
+            future.set_result(None)
+
+    def release(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.in_flight -= 1
+            self._hand_out()
+
+    # --- feedback ---
+
+    def observe(self, endpoint, elapsed, status_code=None, error=None):
+        """Feed one finished request back. status_code is None when the call raised (error is the exception)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.responses += 1
+            reason = self._congestion_reason(endpoint, elapsed, status_code, error)
+            now = time.monotonic()
+            if reason:
+                # One cut per round trip: requests already in flight when we cut will report the same congestion
+                round_trip = self._latency.get(endpoint, {}).get("ewma", elapsed)
+                if now - self._last_decrease >= round_trip:
+                    self._decrease(reason, now)
+            elif self.in_flight >= int(self.limit):  # every slot busy, this request included
+                # +1 per response in slow start, otherwise +1 per full window of responses
+                self.limit = min(self.maximum, self.limit + (1.0 if self.slow_start else 1.0 / self.limit))
+                self.increases += 1
+                self._record(now, "increase")
+            self._hand_out()
+
+    def _congestion_reason(self, endpoint, elapsed, status_code, error):
+        if error is not None:
+            return "timeout" if "timeout" in type(error).__name__.lower() else "error"
+        if status_code in CONGESTION_STATUSES:
+            return CONGESTION_STATUSES[status_code]
+        stats = self._latency.get(endpoint)
+        if stats is None:
+            self._latency[endpoint] = {"ewma": elapsed, "baseline": elapsed}
+            return None
+        stats["ewma"] = (1 - EWMA_WEIGHT) * stats["ewma"] + EWMA_WEIGHT * elapsed
+        spiking = stats["ewma"] > LATENCY_SPIKE_FACTOR * stats["baseline"] and \
+            stats["ewma"] - stats["baseline"] > LATENCY_SPIKE_FLOOR_SECONDS
+        stats["baseline"] = min(stats["ewma"], stats["baseline"] * (1 + BASELINE_DRIFT))
+        return "latency" if spiking else None
+
+    def _decrease(self, reason, now):
+        self.limit = max(float(self.minimum), self.limit * DECREASE_FACTOR)
+        self.slow_start = False
+        self._last_decrease = now
+        self.decreases[reason] = self.decreases.get(reason, 0) + 1
+        log.info(f"[CONCURRENCY] {reason}: limit cut to {int(self.limit)} ({self.in_flight} in flight)")
+        self._record(now, reason)
+
+    def _record(self, now, reason):
+        self.peak_limit = max(self.peak_limit, self.limit)
+        self.low_limit = min(self.low_limit, self.limit)
+        last = self.decisions[-1]["limit"] if self.decisions else self.initial
+        if int(self.limit) != last and len(self.decisions) < MAX_DECISIONS_KEPT:
+            self.decisions.append({"t": round(now - self._started, 3), "limit": int(self.limit), "reason": reason})
+
+    def report(self):
+        """This run's decisions, for the run summary and run_metrics.json."""
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "limit": int(self.limit),
+                "initial": self.initial,
+                "peak_limit": int(self.peak_limit),
+                "low_limit": int(self.low_limit),
+                "peak_in_flight": self.peak_in_flight,
+                "responses": self.responses,
+                "increases": self.increases,
+                "decreases": dict(self.decreases),
+                "decisions": list(self.decisions),
+            }
+
+
+def retry_delay_seconds(response):
+    """How long to wait before retrying a throttled response: its Retry-After, if numeric, else 0."""
+    try:
+        return min(float(response.headers.get("Retry-After") or 0), MAX_RETRY_AFTER_SECONDS)
+    except ValueError:
+        return 0.0
+
+
+# One controller per process, like rate_limiter: every Dear call in this account goes through it.
+concurrency_limiter = AdaptiveConcurrencyLimiter()
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from verve.state_snapshot import read_state
+from verve.structured_log import log
+
+# === CUSTOMER DIRECTORY ===
+# Local CustomerID <-> Customer name map, so a sale whose /sale/order document is missing one of
+# the two can be completed before the PUT instead of failing with "missing 'CustomerID' or
+# 'Customer'". Only a missing field is ever filled in: the PUT exists to stamp a date, so a
+# customer field the document already carries is sent back exactly as it came.
+#
+#   * Every SaleList summary we page through teaches the directory its CustomerID/Customer pair
+#     for free.
+#   * Once a window (or pipeline page) is listed and before any of its sales is built, prepare()
+#     refreshes the directory from /customer if one of those sales needs a pair it does not hold
+#     and it is stale: a full paged load the first time or every CUSTOMER_FULL_REFRESH_DAYS,
+#     otherwise only customers modified since the newest LastModifiedOn we hold (ModifiedSince).
+#     complete() itself never calls the API, so building a payload never waits on the network.
+#   * Entries are kept in LRU order and capped at CUSTOMER_DIRECTORY_MAX_ENTRIES.
+#   * path=None keeps the directory in memory only: it starts empty and is never saved (replays).
+
+CUSTOMER_DIRECTORY_FILE = os.getenv("VERVE_CUSTOMER_DIRECTORY_FILE", "customer_directory.json")
+CUSTOMER_DIRECTORY_MAX_ENTRIES = int(os.getenv("VERVE_CUSTOMER_DIRECTORY_MAX", "100000"))
+CUSTOMER_DIRECTORY_TTL_SECONDS = 24 * 3600
+CUSTOMER_FULL_REFRESH_DAYS = 7
+CUSTOMER_PAGE_SIZE = 1000
+
+
+def _name_key(name):
+    return " ".join(str(name).split()).casefold()
+
+
+class CustomerDirectory:
+    def __init__(self, path=CUSTOMER_DIRECTORY_FILE, max_entries=CUSTOMER_DIRECTORY_MAX_ENTRIES,
+                 ttl_seconds=CUSTOMER_DIRECTORY_TTL_SECONDS, enabled=True):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self.meta = None
+        self._names = OrderedDict()   # CustomerID -> name, least recently used first
+        self._ids = {}                # normalised name -> CustomerID
+        self._dirty = False
+        self._lock = threading.RLock()
+        self.stats = {"completed": 0, "unresolved": 0, "api_pages": 0, "evictions": 0}
+
+    # --- storage ---
+
+    def _load(self):
+        if self.meta is not None:
+            return
+        try:
+            data = json.loads((read_state(self.path) if self.path else None) or b"{}")
+        except (OSError, ValueError):
+            data = {}
+        self.meta = data.get("meta", {})
+        for customer_id, name in data.get("customers", {}).items():
+            self._put(customer_id, name)
+        self._dirty = False
+
+    def save(self):
+        with self._lock:
+            if not self.enabled or not self.path or self.meta is None or not self._dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"meta": self.meta, "customers": dict(self._names)}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def _put(self, customer_id, name):
+        old_name = self._names.pop(customer_id, None)
+        if old_name is not None and self._ids.get(_name_key(old_name)) == customer_id:
+            del self._ids[_name_key(old_name)]
+        self._names[customer_id] = name
+        self._ids[_name_key(name)] = customer_id
+        while len(self._names) > self.max_entries:
+            evicted_id, evicted_name = self._names.popitem(last=False)
+            if self._ids.get(_name_key(evicted_name)) == evicted_id:
+                del self._ids[_name_key(evicted_name)]
+            self.stats["evictions"] += 1
+
+    # --- lookups ---
+
+    def learn(self, customer_id, name):
+        """Record a CustomerID/name pair seen in an API response."""
+        if not self.enabled or not customer_id or not name:
+            return
+        with self._lock:
+            self._load()
+            if self._names.get(customer_id) != name:
+                self._put(customer_id, name)
+                self._dirty = True
+            else:
+                self._names.move_to_end(customer_id)
+
+    def name_for(self, customer_id):
+        with self._lock:
+            self._load()
+            name = self._names.get(customer_id)
+            if name is not None:
+                self._names.move_to_end(customer_id)
+            return name
+
+    def id_for(self, name):
+        with self._lock:
+            self._load()
+            customer_id = self._ids.get(_name_key(name))
+            if customer_id is not None:
+                self._names.move_to_end(customer_id)
+            return customer_id
+
+    # --- refresh ---
+
+    def is_stale(self):
+        self._load()
+        return time.time() - self.meta.get("refreshed_at", 0) > self.ttl_seconds
+
+    def refresh(self, iter_pages):
+        """Bring the directory up to date from /customer. iter_pages(extra_params) yields CustomerList pages."""
+        with self._lock:
+            self._load()
+            now = time.time()
+            full = not self.meta.get("watermark") or \
+                now - self.meta.get("full_refresh_at", 0) > CUSTOMER_FULL_REFRESH_DAYS * 86400
+            extra_params = None if full else {"ModifiedSince": self.meta["watermark"]}
+            log.info(f"[CUSTOMER DIRECTORY] {'Full load' if full else 'Incremental refresh'} from /customer...")
+            watermark = self.meta.get("watermark")
+            for customers in iter_pages(extra_params):
+                self.stats["api_pages"] += 1
+                for customer in customers:
+                    if customer.get("ID") and customer.get("Name"):
+                        self._put(customer["ID"], customer["Name"])
+                    modified = customer.get("LastModifiedOn")
+                    if modified and (watermark is None or modified > watermark):
+                        watermark = modified
+            self.meta["watermark"] = watermark
+            self.meta["refreshed_at"] = now
+            if full:
+                self.meta["full_refresh_at"] = now
+            self._dirty = True
+            self.save()
+
+    def _missing_pair(self, sale):
+        """True if the sale has only one of CustomerID/Customer and the directory cannot supply the other."""
+        customer_id = sale.get("CustomerID") or None
+        name = sale.get("Customer") or None
+        if bool(customer_id) == bool(name):
+            return False
+        return (self.name_for(customer_id) if customer_id else self.id_for(name)) is None
+
+    def prepare(self, sales, iter_pages):
+        """Refresh from /customer now if one of these listed sales needs a pair we lack and we are stale.
+
+        Called once per listing (per page in the pipeline), before any of the sales is built.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if self.is_stale() and any(self._missing_pair(sale) for sale in sales):
+                self.refresh(iter_pages)
+
+    def complete(self, sale_data):
+        """Fill a missing CustomerID or Customer in place from the directory; never changes a field that is set.
+
+        Returns a short description of what was filled in, or None. Never calls the API.
+        """
+        if not self.enabled:
+            return None
+        customer_id = sale_data.get("CustomerID") or None
+        name = sale_data.get("Customer") or None
+        if customer_id and name:
+            return None
+        if not customer_id and not name:
+            self.stats["unresolved"] += 1
+            return None
+
+        resolved = self.name_for(customer_id) if customer_id else self.id_for(name)
+        if resolved is None:
+            self.stats["unresolved"] += 1
+            return None
+        self.stats["completed"] += 1
+        if customer_id:
+            sale_data["Customer"] = resolved
+            return f"filled Customer '{resolved}' for CustomerID {customer_id}"
+        sale_data["CustomerID"] = resolved
+        return f"filled CustomerID {resolved} for Customer '{name}'"
+
+
+customer_directory = CustomerDirectory()
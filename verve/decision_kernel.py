@@ -0,0 +1,202 @@
+from datetime import datetime
+
+from verve.stamp_cache import STAMP_DATE_FORMATS, parse_stamp_date, stamp_matches_order_date
+
+# === BATCH DECISION KERNEL ===
+# Classifies a whole SaleList page (or a whole cached day) in one pass instead of one sale at a
+# time: OrderDate parsing, the window filter, the MM/DD/YYYY reformat for AdditionalAttribute2 and
+# the comparison with the stamp cache run as pyarrow.compute kernels over columns.
+#
+# Every sale lands in exactly one bucket:
+#   excluded      no SaleID or no OrderDate (silently dropped, as the SaleList loop always did)
+#   invalid_date  OrderDate does not parse as YYYY-MM-DD
+#   outside       before from_date or on/after to_date
+#   unknown       in the window, not in the stamp cache
+#   unstamped     in the cache with an empty AdditionalAttribute2
+#   matched       in the cache, stamped with its own OrderDate
+#   mismatched    in the cache, stamped with something else
+# Only unknown/unstamped (and mismatched, when overwriting) need a GET; everything else is decided.
+#
+# Arrow parses dates more leniently than datetime.strptime (it rolls 2025-02-30 over to March), so
+# any value whose parse does not round-trip to the same text is decided by the Python reference
+# instead; both paths give identical buckets. The stamp cache is a dict, so the join is one lookup
+# per in-window sale; all the parsing and comparing around it is vectorised.
+#
+# pyarrow is optional: without it, or for pages under KERNEL_MIN_ROWS (where building arrays costs
+# more than it saves), the Python reference runs.
+
+KERNEL_MIN_ROWS = 250  # measured crossover: arrow has ~3 ms of fixed cost per call
+ORDER_DATE_FORMAT = "%Y-%m-%d"
+ATTRIBUTE_DATE_FORMAT = "%m/%d/%Y"
+# Shape of each accepted date format: regex, then where its month and day digits sit
+DATE_PATTERNS = {
+    "%Y-%m-%d": (r"^\d{4}-\d{2}-\d{2}$", (5, 7), (8, 10)),
+    "%m/%d/%Y": (r"^\d{2}/\d{2}/\d{4}$", (0, 2), (3, 5)),
+}
+IN_WINDOW_BUCKETS = ("unknown", "unstamped", "matched", "mismatched")
+BUCKETS = ("excluded", "invalid_date", "outside") + IN_WINDOW_BUCKETS
+
+_pyarrow = None
+
+
+def _arrow():
+    """(pyarrow, pyarrow.compute), or None if pyarrow is not installed."""
+    global _pyarrow
+    if _pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.compute
+
+            _pyarrow = (pyarrow, pyarrow.compute)
+        except ImportError:
+            _pyarrow = False
+    return _pyarrow or None
+
+
+def parse_order_day(order_date):
+    """The date part of a SaleList OrderDate as a datetime, or None if it does not parse."""
+    try:
+        return datetime.strptime(str(order_date).split("T")[0], ORDER_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def classify_sales(sales, from_date=None, to_date=None, stamp_cache=None, use_arrow=None):
+    """Bucket SaleList summaries against the window [from_date, to_date) and the stamp cache.
+
+    Returns {bucket: [indexes into sales], ..., "in_window": [indexes, in page order],
+    "formatted": [OrderDate as MM/DD/YYYY for in-window sales, else None]}. Without a stamp cache
+    every in-window sale is "unknown"; without from_date/to_date the window is unbounded.
+    """
+    if use_arrow is None:
+        use_arrow = len(sales) >= KERNEL_MIN_ROWS
+    if use_arrow and _arrow():
+        pa = _arrow()[0]
+        try:
+            return _classify_arrow(sales, from_date, to_date, stamp_cache)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            pass  # a field of an unexpected type: let the reference loop decide
+    return _classify_python(sales, from_date, to_date, stamp_cache)
+
+
+def _stamp_bucket(stamp_cache, sale):
+    entry = stamp_cache.get(sale["SaleID"]) if stamp_cache is not None else None
+    if entry is None:
+        return "unknown"
+    attr2_value = entry.get("AdditionalAttribute2")
+    if attr2_value is None or str(attr2_value).strip() == "":
+        return "unstamped"
+    return "matched" if stamp_matches_order_date(attr2_value, sale["OrderDate"]) else "mismatched"
+
+
+def _classify_python(sales, from_date, to_date, stamp_cache):
+    result = {bucket: [] for bucket in BUCKETS}
+    result["in_window"] = []
+    formatted = [None] * len(sales)
+    for i, sale in enumerate(sales):
+        if not sale.get("SaleID") or not sale.get("OrderDate"):
+            result["excluded"].append(i)
+            continue
+        order_day = parse_order_day(sale["OrderDate"])
+        if order_day is None:
+            result["invalid_date"].append(i)
+        elif (from_date and order_day < from_date) or (to_date and order_day >= to_date):
+            result["outside"].append(i)
+        else:
+            result["in_window"].append(i)
+            formatted[i] = order_day.strftime(ATTRIBUTE_DATE_FORMAT)
+            result[_stamp_bucket(stamp_cache, sale)].append(i)
+    result["formatted"] = formatted
+    return result
+
+
+def _parse_dates(pa, pc, text, formats, reference):
+    """strptime a string column with the first format in DATE_PATTERNS that the value fits exactly.
+
+    Arrow's strftime is too slow for a round-trip check, so "exactly" is the format's regex plus
+    the parsed month and day matching the digits written (arrow rolls 02/30 over into March).
+    Values no format fits (unpadded or impossible dates, stray characters) are re-parsed one by
+    one with reference(), so the result always matches the Python path.
+    """
+    day = pc.list_element(pc.split_pattern(text, "T", max_splits=1), 0)
+    parsed = pa.nulls(len(text), pa.timestamp("s"))
+    for fmt in formats:
+        pattern, (month_start, month_end), (day_start, day_end) = DATE_PATTERNS[fmt]
+        shaped = pc.fill_null(pc.match_substring_regex(day, pattern), False)
+        attempt = pc.strptime(pc.if_else(shaped, day, None), format=fmt, unit="s", error_is_null=True)
+        written_month = pc.cast(pc.utf8_slice_codeunits(pc.if_else(shaped, day, None), month_start, month_end), pa.int64())
+        written_day = pc.cast(pc.utf8_slice_codeunits(pc.if_else(shaped, day, None), day_start, day_end), pa.int64())
+        exact = pc.fill_null(pc.and_(pc.equal(pc.month(attempt), written_month), pc.equal(pc.day(attempt), written_day)), False)
+        parsed = pc.if_else(exact, attempt, parsed)
+    doubtful = pc.and_(pc.is_valid(text), pc.is_null(parsed))
+    if pc.any(doubtful).as_py():
+        values = pc.filter(text, doubtful).to_pylist()
+        parsed = pc.replace_with_mask(parsed, doubtful, pa.array([reference(v) for v in values], pa.timestamp("s")))
+    return parsed
+
+
+def _attribute_text(pa, pc, days):
+    """MM/DD/YYYY for a timestamp column, assembled from its parts (arrow's strftime is slow)."""
+    def part(values, width):
+        return pc.utf8_lpad(pc.cast(values, pa.string()), width, "0")
+
+    return pc.binary_join_element_wise(part(pc.month(days), 2), part(pc.day(days), 2), part(pc.year(days), 4), "/")
+
+
+def _classify_arrow(sales, from_date, to_date, stamp_cache):
+    pa, pc = _arrow()
+    rows = pa.array(sales, type=pa.struct([("SaleID", pa.string()), ("OrderDate", pa.string())]))
+    sale_ids, order_dates = rows.field("SaleID"), rows.field("OrderDate")
+    present = pc.fill_null(pc.and_(pc.greater(pc.utf8_length(sale_ids), 0),
+                                   pc.greater(pc.utf8_length(order_dates), 0)), False)
+
+    order_days = _parse_dates(pa, pc, pc.if_else(present, order_dates, None), (ORDER_DATE_FORMAT,), parse_order_day)
+    parsed = pc.is_valid(order_days)
+    in_window = parsed
+    if from_date:
+        in_window = pc.and_(in_window, pc.fill_null(pc.greater_equal(order_days, pa.scalar(from_date, pa.timestamp("s"))), False))
+    if to_date:
+        in_window = pc.and_(in_window, pc.fill_null(pc.less(order_days, pa.scalar(to_date, pa.timestamp("s"))), False))
+
+    result = {
+        "excluded": pc.indices_nonzero(pc.invert(present)).to_pylist(),
+        "invalid_date": pc.indices_nonzero(pc.and_(present, pc.invert(parsed))).to_pylist(),
+        "outside": pc.indices_nonzero(pc.and_(parsed, pc.invert(in_window))).to_pylist(),
+        "in_window": pc.indices_nonzero(in_window).to_pylist(),
+    }
+    window_index = result["in_window"]
+    formatted = [None] * len(sales)
+    for i, text in zip(window_index, _attribute_text(pa, pc, pc.filter(order_days, in_window)).to_pylist()):
+        formatted[i] = text
+    result["formatted"] = formatted
+
+    if stamp_cache is None:
+        result.update({bucket: [] for bucket in IN_WINDOW_BUCKETS})
+        result["unknown"] = list(window_index)
+        return result
+
+    # The join: one dict lookup per in-window sale
+    entries = [stamp_cache.get(sales[i]["SaleID"]) for i in window_index]
+    known = pa.array([entry is not None for entry in entries], pa.bool_())
+    stamps = pc.utf8_trim_whitespace(pa.array(
+        [None if entry is None or entry.get("AdditionalAttribute2") is None else str(entry["AdditionalAttribute2"])
+         for entry in entries], pa.string()))
+    stamped = pc.fill_null(pc.greater(pc.utf8_length(stamps), 0), False)
+    stamp_text = pc.if_else(stamped, stamps, None)
+
+    stamp_days = _parse_dates(pa, pc, stamp_text, STAMP_DATE_FORMATS, lambda v: _as_datetime(parse_stamp_date(v)))
+    matched = pc.and_(stamped, pc.fill_null(pc.equal(stamp_days, pc.filter(order_days, in_window)), False))
+
+    masks = {
+        "unknown": pc.invert(known),
+        "unstamped": pc.and_(known, pc.invert(stamped)),
+        "matched": matched,
+        "mismatched": pc.and_(stamped, pc.invert(matched)),
+    }
+    for bucket, mask in masks.items():
+        result[bucket] = [window_index[j] for j in pc.indices_nonzero(mask).to_pylist()]
+    return result
+
+
+def _as_datetime(day):
+    return None if day is None else datetime(day.year, day.month, day.day)
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+from verve.stamp_cache import stamp_matches_order_date
+from verve.stamped_set import stamped_sales
+from verve.state_snapshot import read_state
+
+# === STAMP FRESHNESS ===
+# What matters downstream is how soon after a sale is entered it carries the right
+# AdditionalAttribute2, not how fast a run is. Every processed sale is recorded here (through
+# report_sale_result, so all engines are covered):
+#
+#   stamped     updated this run: order-to-stamp latency = PUT time - OrderDate
+#   fresh       already carried the right stamp (or is in the compact stamped set)
+#   mismatched  carries some other date, left alone unless overwriting
+#   backlog     still unstamped when the run ended: failed, or held in quarantine
+#
+# The SaleList has no creation timestamp, so latency is measured from OrderDate (usually midnight,
+# account time): it includes the part of the day before the order was keyed in, the same for every
+# run, so runs stay comparable. Latency percentiles and backlog are reported for the run and per
+# order day, printed in the run summary, stored in last_run_metrics.json and appended to
+# FRESHNESS_FILE, so `verve freshness` can show whether a change to the schedule, concurrency or
+# engine actually moved them.
+
+FRESHNESS_FILE = os.getenv("VERVE_FRESHNESS_FILE", "freshness_history.jsonl")
+FRESHNESS_HISTORY_RUNS = 1000  # runs kept in FRESHNESS_FILE
+PERCENTILES = (50, 90, 99)
+
+
+def parse_order_time(order_date):
+    """A SaleList OrderDate (with or without its time part) as a datetime, or None."""
+    text = str(order_date or "")[:19]
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def latency_summary(seconds):
+    """count, nearest-rank p50/p90/p99 and max of a list of latencies, in seconds."""
+    if not seconds:
+        return {"count": 0}
+    ordered = sorted(seconds)
+    summary = {"count": len(ordered)}
+    for p in PERCENTILES:
+        summary[f"p{p}"] = round(ordered[max(0, -(-len(ordered) * p // 100) - 1)], 1)
+    summary["max"] = round(ordered[-1], 1)
+    return summary
+
+
+def format_age(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 2 * 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
+
+class FreshnessTracker:
+    def __init__(self, path=FRESHNESS_FILE, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.latencies = {}   # order day -> [seconds from OrderDate to our PUT]
+        self.counts = {}      # order day -> {"fresh", "mismatched", "backlog"}
+        self.oldest_backlog = None  # seconds
+
+    def record(self, sale, status, stamp=None):
+        if not self.enabled:
+            return
+        order_time = parse_order_time(sale.get("OrderDate"))
+        if order_time is None:
+            return
+        day = order_time.date().isoformat()
+        age = max(0.0, (datetime.now() - order_time).total_seconds())
+        if status == "updated":
+            kind = "stamped"
+        elif stamp:
+            kind = "fresh" if stamp_matches_order_date(stamp, sale["OrderDate"]) else "mismatched"
+        elif status == "skipped" and stamped_sales.knows(sale["SaleID"]):
+            kind = "fresh"
+        else:
+            kind = "backlog"
+        with self._lock:
+            if kind == "stamped":
+                self.latencies.setdefault(day, []).append(age)
+                return
+            counts = self.counts.setdefault(day, {"fresh": 0, "mismatched": 0, "backlog": 0})
+            counts[kind] += 1
+            if kind == "backlog" and (self.oldest_backlog is None or age > self.oldest_backlog):
+                self.oldest_backlog = age
+
+    def report(self):
+        with self._lock:
+            days = {}
+            for day in sorted(set(self.latencies) | set(self.counts), reverse=True):
+                days[day] = {"latency_seconds": latency_summary(self.latencies.get(day, [])),
+                             **self.counts.get(day, {"fresh": 0, "mismatched": 0, "backlog": 0})}
+            return {
+                "latency_seconds": latency_summary([s for samples in self.latencies.values() for s in samples]),
+                "fresh": sum(day["fresh"] for day in days.values()),
+                "mismatched": sum(day["mismatched"] for day in days.values()),
+                "backlog": sum(day["backlog"] for day in days.values()),
+                "oldest_backlog_seconds": round(self.oldest_backlog) if self.oldest_backlog is not None else None,
+                "days": days,
+            }
+
+    def save(self, run_info):
+        """Append this run's report, with run_info (engine, window, settings), to FRESHNESS_FILE."""
+        if not self.enabled:
+            return
+        lines = (read_state(self.path) or b"").decode("utf-8").splitlines()
+        lines.append(json.dumps({"finished_at": datetime.now().isoformat(timespec="seconds"), **run_info,
+                                 **self.report()}, separators=(",", ":")))
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines[-FRESHNESS_HISTORY_RUNS:]) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def history(self, runs=None):
+        lines = (read_state(self.path) or b"").decode("utf-8").splitlines()
+        records = []
+        for line in lines[-runs:] if runs else lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # a torn line from an interrupted save
+        return records
+
+
+def format_latency(summary):
+    if not summary.get("count"):
+        return "no sales stamped"
+    return (f"p50 {format_age(summary['p50'])} / p90 {format_age(summary['p90'])} / "
+            f"p99 {format_age(summary['p99'])} / max {format_age(summary['max'])}")
+
+
+def print_freshness_history(records, days=False):
+    print(f"\n=== STAMP FRESHNESS (last {len(records)} runs) ===")
+    if not records:
+        print("  No runs recorded yet.")
+        return
+    print(f"  {'finished':<21}{'engine':<10}{'conc':>5}{'stamped':>9}{'p50':>8}{'p90':>8}{'max':>8}"
+          f"{'backlog':>9}{'oldest':>8}{'mismatched':>12}")
+    for record in records:
+        latency = record["latency_seconds"]
+        print(f"  {record['finished_at']:<21}{record.get('engine', '?'):<10}{record.get('concurrency_limit') or '-':>5}"
+              f"{latency['count']:>9}{format_age(latency.get('p50')):>8}{format_age(latency.get('p90')):>8}"
+              f"{format_age(latency.get('max')):>8}{record['backlog']:>9}"
+              f"{format_age(record.get('oldest_backlog_seconds')):>8}{record['mismatched']:>12}")
+    if days:
+        last = records[-1]
+        print(f"\n  By order day, run of {last['finished_at']}:")
+        print(f"    {'day':<12}{'stamped':>9}{'p50':>8}{'p90':>8}{'max':>8}{'fresh':>8}{'backlog':>9}")
+        for day, stats in last["days"].items():
+            latency = stats["latency_seconds"]
+            print(f"    {day:<12}{latency['count']:>9}{format_age(latency.get('p50')):>8}"
+                  f"{format_age(latency.get('p90')):>8}{format_age(latency.get('max')):>8}"
+                  f"{stats['fresh']:>8}{stats['backlog']:>9}")
+
+
+freshness = FreshnessTracker()
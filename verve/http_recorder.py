@@ -0,0 +1,147 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+# === HTTP RECORD / REPLAY ===
+# Sits under send_dear_request (and its async twin) so every engine can be recorded or replayed.
+#   VERVE_HTTP_MODE=record  -> real calls, each exchange appended to the cassette (credentials scrubbed)
+#   VERVE_HTTP_MODE=replay  -> no network; responses served from the cassette
+#   VERVE_REPLAY_TIME_SCALE -> 1.0 replays the recorded latency, 0.1 compresses it 10x, 0 serves instantly
+#
+# A cassette is JSONL: one header line {"cassette": {...window...}} followed by one line per exchange.
+
+HTTP_MODE = os.getenv("VERVE_HTTP_MODE", "off")
+CASSETTE_FILE = os.getenv("VERVE_HTTP_CASSETTE", "cassettes/recording.jsonl")
+REPLAY_TIME_SCALE = float(os.getenv("VERVE_REPLAY_TIME_SCALE", "1.0"))
+
+SCRUBBED = "<scrubbed>"
+
+_lock = threading.Lock()
+_replay_exchanges = None   # request key -> deque of recorded exchanges
+cassette_header = {}
+
+
+class CassetteMiss(Exception):
+    """Replay was asked for a request that is not in the cassette."""
+
+
+def request_key(method, url, params=None, json_body=None):
+    """Host-independent identity of a request: method, path, sorted query, and the sale for PUTs."""
+    parsed = urlparse(url)
+    path = parsed.path.lower()
+    # Strip the API prefix so a cassette recorded against Dear replays against any base URL
+    if "/externalapi/v2" in path:
+        path = path.split("/externalapi/v2", 1)[1]
+    query = parse_qsl(parsed.query) + [(k, str(v)) for k, v in (params or {}).items()]
+    key = f"{method.upper()} {path}?{urlencode(sorted(query))}"
+    if json_body is not None:
+        key += f" ID={json_body.get('ID') or json_body.get('SaleID')}"
+    return key
+
+
+def _scrub(text):
+    for secret in (os.getenv("DEAR_API_KEY"), os.getenv("DEAR_ACCOUNT_ID")):
+        if secret:
+            text = text.replace(secret, SCRUBBED)
+    return text
+
+
+# === RECORD ===
+def start_recording(from_str, to_str, path=None):
+    global HTTP_MODE, CASSETTE_FILE
+    HTTP_MODE = "record"
+    CASSETTE_FILE = path or CASSETTE_FILE
+    os.makedirs(os.path.dirname(CASSETTE_FILE) or ".", exist_ok=True)
+    header = {"cassette": {"from": from_str, "to": to_str, "recorded_at": datetime.now().isoformat(timespec="seconds")}}
+    with open(CASSETTE_FILE, "w", encoding="utf-8") as f:
+        f.write(json.dumps(header) + "\n")
+
+
+def record_exchange(method, url, params, json_body, status_code, response_text, elapsed):
+    exchange = {
+        "key": request_key(method, url, params, json_body),
+        "status": status_code,
+        "elapsed": round(elapsed, 4),
+        "request_bytes": len(json.dumps(json_body)) if json_body is not None else 0,
+        "body": response_text,
+    }
+    line = _scrub(json.dumps(exchange))
+    with _lock:
+        with open(CASSETTE_FILE, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+# === REPLAY ===
+class ReplayedRequest:
+    def __init__(self, request_bytes):
+        self.body = b" " * request_bytes      # requests-style
+        self.content = self.body              # httpx-style
+
+
+class ReplayedResponse:
+    """Just enough of the requests/httpx response interface for the engines."""
+
+    def __init__(self, exchange):
+        self.status_code = exchange["status"]
+        self.text = exchange["body"]
+        self.content = self.text.encode("utf-8")
+        self.headers = {"Content-Type": "application/json"}
+        self.request = ReplayedRequest(exchange.get("request_bytes", 0))
+        self.elapsed = timedelta(seconds=exchange["elapsed"] * REPLAY_TIME_SCALE)
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def load_cassette(path=None):
+    global HTTP_MODE, CASSETTE_FILE, _replay_exchanges, cassette_header
+    HTTP_MODE = "replay"
+    CASSETTE_FILE = path or CASSETTE_FILE
+    exchanges = defaultdict(deque)
+    with open(CASSETTE_FILE, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if "cassette" in record:
+                cassette_header = record["cassette"]
+            else:
+                exchanges[record["key"]].append(record)
+    _replay_exchanges = exchanges
+    return cassette_header
+
+
+def _next_exchange(method, url, params, json_body):
+    if _replay_exchanges is None:
+        load_cassette()
+    key = request_key(method, url, params, json_body)
+    with _lock:
+        recorded = _replay_exchanges.get(key)
+        if not recorded:
+            raise CassetteMiss(f"No recorded response for {key}")
+        # Serve repeated requests in recorded order; the last one keeps answering after that
+        return recorded.popleft() if len(recorded) > 1 else recorded[0]
+
+
+def replay(method, url, params=None, json_body=None):
+    exchange = _next_exchange(method, url, params, json_body)
+    time.sleep(exchange["elapsed"] * REPLAY_TIME_SCALE)
+    return ReplayedResponse(exchange)
+
+
+async def replay_async(method, url, params=None, json_body=None):
+    import asyncio  # kept off the import path of the sync engines and the CLI
+
+    exchange = _next_exchange(method, url, params, json_body)
+    await asyncio.sleep(exchange["elapsed"] * REPLAY_TIME_SCALE)
+    return ReplayedResponse(exchange)
+
+
+def replaying():
+    return HTTP_MODE == "replay"
+
+
+def recording():
+    return HTTP_MODE == "record"
@@ -0,0 +1,711 @@
+from datetime import datetime, timedelta
+import os
+from dotenv import load_dotenv
+import json
+import logging
+import time # For rate limiting
+import argparse
+from verve.rate_limit import API_CALL_DELAY_SECONDS, rate_limiter
+from verve.concurrency import CONGESTION_RETRIES, CONGESTION_STATUSES, concurrency_limiter, retry_delay_seconds
+from verve.profiling import stage, trace_request, format_stage_table
+from verve import http_recorder
+from verve.sale_cache import sale_document_cache
+from verve.salelist_cache import salelist_cache
+from verve.sale_export import MISSING_PYARROW_MESSAGE, pyarrow_available, sale_exporter
+from verve.page_tuner import page_size_tuner
+from verve.customer_directory import CUSTOMER_PAGE_SIZE, customer_directory
+from verve.quarantine import sale_quarantine
+from verve.change_feed import change_feed
+from verve.freshness import format_age, format_latency, freshness
+from verve.stamped_set import stamped_sales
+from verve.state_snapshot import snapshot
+from verve.decision_kernel import IN_WINDOW_BUCKETS, classify_sales
+from verve.structured_log import log, log_sale, configure_logging, flush_logs, sampling_report
+from verve.stamp_cache import load_stamp_cache, save_stamp_cache, record_stamp, stamp_matches_order_date
+
+# Load environment variables from .env file
+load_dotenv()
+
+# === CONFIGURATION ===
+# DEAR_API_BASE_URL can point the scripts at mock_dear_server.py for local benchmarking
+API_BASE_URL = os.getenv("DEAR_API_BASE_URL", "https://inventory.dearsystems.com/ExternalApi/v2")
+
+# Credentials are resolved on the first API call, not at import, so `--help`, plans served from
+# cache and local lookups start without them (and without paying for `requests`).
+HEADERS = None
+
+def dear_headers():
+    global HEADERS
+    if HEADERS is None:
+        api_key = os.getenv("DEAR_API_KEY")      # Load from environment variables
+        account_id = os.getenv("DEAR_ACCOUNT_ID")    # Load from environment variables
+        if not api_key or not account_id:
+            raise ValueError("Missing required environment variables: DEAR_API_KEY and DEAR_ACCOUNT_ID")
+        HEADERS = {
+            "api-auth-accountid": account_id,
+            "api-auth-applicationkey": api_key,
+            "Content-Type": "application/json"
+        }
+    return HEADERS
+
+_requests = None
+
+def http_client():
+    """The requests module, imported on first use: it and urllib3 are most of this module's import time."""
+    global _requests
+    if _requests is None:
+        import requests
+        import urllib3
+
+        # Suppress SSL warnings (useful for development, but consider proper SSL certs in production)
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        _requests = requests
+    return _requests
+
+# === API RATE LIMITING SETTINGS ===
+# See rate_limit.py: every call waits on the shared rate_limiter (~54 calls/minute by default).
+# How many calls may be open at once is adapted during the run by concurrency_limiter (concurrency.py).
+
+# SaleList fields kept with each sale for our own bookkeeping but never sent back in the PUT body.
+# "Updated" is the list's modification timestamp, used to validate cached /sale/order documents.
+LIST_ONLY_FIELDS = ("Updated",)
+
+# === PAGINATION SETTING ===
+# The /salelist Limit is picked per listing by page_tuner.py from measured latency and bytes per page.
+
+# === HTTP HELPER ===
+# Every Dear call goes through here: it waits for a rate-limit slot and a concurrency slot
+# (concurrency.py), reports the outcome back to the concurrency controller, times the request
+# under its endpoint's profiling stage and reports it if it was unusually slow. Throttled and
+# overloaded responses (429/502/503/504) are retried up to CONGESTION_RETRIES times.
+# In record/replay mode (see http_recorder.py) the exchange is saved to or served from a cassette.
+def send_dear_request(method, url, endpoint, sale_id=None, headers=None, **kwargs):
+    for retries in range(CONGESTION_RETRIES + 1):
+        with stage("rate_wait"):
+            rate_limiter.wait()
+        with stage("concurrency_wait"):
+            concurrency_limiter.acquire()
+        try:
+            with stage(endpoint):
+                started = time.perf_counter()
+                try:
+                    if http_recorder.replaying():
+                        response = http_recorder.replay(method, url, kwargs.get("params"), kwargs.get("json"))
+                    else:
+                        response = http_client().request(method, url, headers={**dear_headers(), **(headers or {})}, verify=False, **kwargs)
+                except Exception as e:
+                    concurrency_limiter.observe(endpoint, time.perf_counter() - started, error=e)
+                    raise
+                elapsed = time.perf_counter() - started
+            concurrency_limiter.observe(endpoint, elapsed, response.status_code)
+        finally:
+            concurrency_limiter.release()
+        if http_recorder.recording():
+            http_recorder.record_exchange(method, url, kwargs.get("params"), kwargs.get("json"),
+                                          response.status_code, response.text, elapsed)
+        # Throttled: the controller has already backed off, so try again rather than fail the sale
+        if response.status_code not in CONGESTION_STATUSES or retries == CONGESTION_RETRIES:
+            break
+        log.debug("%s returned %s, retrying (%d/%d)", endpoint, response.status_code, retries + 1, CONGESTION_RETRIES)
+        time.sleep(retry_delay_seconds(response))
+    payload_bytes = len(response.content) + len(response.request.body or b"")
+    trace_request(endpoint, elapsed, response.status_code, sale_id=sale_id, payload_bytes=payload_bytes, retries=retries)
+    return response
+
+# === STEP 1: GET ALL SALE IDS (and essential details) with Pagination ===
+def classify_sales_in_window(sales_from_list, from_date, to_date, stamp_cache=None):
+    """Essential details of the SaleList entries in [from_date, to_date), each with its stamp-cache bucket.
+
+    The whole page is classified in one pass by decision_kernel.classify_sales. Returns
+    [(essential, bucket), ...] in page order; without a stamp_cache every bucket is "unknown".
+    """
+    buckets = classify_sales(sales_from_list, from_date, to_date, stamp_cache)
+    change_feed.publish_listed(sales_from_list)
+    for i in buckets["invalid_date"]:
+        sale = sales_from_list[i]
+        log.warning(f"Error processing order date for sale {sale.get('SaleID')}: unparseable OrderDate '{sale['OrderDate']}'")
+
+    # Every summary carries a CustomerID/Customer pair the directory can keep for free
+    unparsed = set(buckets["excluded"]).union(buckets["invalid_date"])
+    for customer_id, customer in dict.fromkeys((sale.get("CustomerID"), sale.get("Customer"))
+                                               for i, sale in enumerate(sales_from_list) if i not in unparsed):
+        customer_directory.learn(customer_id, customer)
+
+    bucket_of = {i: bucket for bucket in IN_WINDOW_BUCKETS for i in buckets[bucket]}
+    classified = []
+    for i in buckets["in_window"]:
+        sale = sales_from_list[i]
+        classified.append(({
+            "SaleID": sale["SaleID"],
+            "OrderDate": sale.get("OrderDate"),
+            "CustomerID": sale.get("CustomerID"),
+            "Customer": sale.get("Customer"),
+            "OrderNumber": sale.get("OrderNumber"),
+            "Updated": sale.get("Updated")
+        }, bucket_of[i]))
+    return classified
+
+def extract_sales_in_window(sales_from_list, from_date, to_date):
+    """Keep the essential details of SaleList entries whose OrderDate falls in [from_date, to_date)."""
+    return [essential for essential, _ in classify_sales_in_window(sales_from_list, from_date, to_date)]
+
+def iter_sale_list_pages(extra_params=None):
+    """Yield raw /salelist pages one at a time until an empty page or an error.
+
+    The generator returns True once it reaches the empty last page and False if an error cut the
+    listing short, so the SaleList cache can tell a complete listing from a partial one.
+    """
+    url = f"{API_BASE_URL}/salelist"
+    page = 1
+    # Filtered listings (UpdatedSince deltas) are too small to measure, so they never explore
+    page_size, reason = page_size_tuner.choose(explore=not extra_params)
+    log.info(f"SaleList page size {page_size}: {reason}")
+
+    try:
+        while True:
+            params = {
+                "Page": page,
+                "Limit": page_size,
+                **(extra_params or {})
+            }
+
+            log.info(f"Fetching page {page} with limit {page_size}...", extra={"sample": "salelist_page"})
+            response = send_dear_request("GET", url, "salelist", params=params)
+
+            if response.status_code != 200:
+                log.error(f"Failed to fetch sale list on page {page}: {response.text}")
+                return False
+
+            with stage("json_decode"):
+                sales_from_list = response.json().get("SaleList", [])
+            page_size_tuner.observe(page_size, len(sales_from_list), response.elapsed.total_seconds(),
+                                    len(response.content))
+
+            if not sales_from_list:
+                log.info(f"No more sales found on page {page}. End of pagination.")
+                return True
+
+            yield sales_from_list
+            page += 1
+    finally:
+        page_size_tuner.finish_listing(page_size)
+
+def fetch_sale_list_total():
+    """One Limit=1 call: the account's total number of sales, or None if unavailable."""
+    response = send_dear_request("GET", f"{API_BASE_URL}/salelist", "salelist", params={"Page": 1, "Limit": 1})
+    if response.status_code != 200:
+        return None
+    return response.json().get("Total")
+
+def iter_customer_pages(extra_params=None):
+    """Yield /customer pages (CustomerList) for the customer directory's bulk and incremental loads."""
+    url = f"{API_BASE_URL}/customer"
+    page = 1
+    while True:
+        response = send_dear_request("GET", url, "customer", params={"Page": page, "Limit": CUSTOMER_PAGE_SIZE,
+                                                                     **(extra_params or {})})
+        if response.status_code != 200:
+            log.error(f"Failed to fetch customer list on page {page}: {response.text}")
+            return
+        customers = response.json().get("CustomerList", [])
+        if not customers:
+            return
+        yield customers
+        page += 1
+
+def iter_window_pages(from_date_str, to_date_str):
+    """SaleList pages covering the window: from the day cache when enabled, else straight from the API."""
+    if salelist_cache.enabled:
+        return salelist_cache.iter_window_pages(from_date_str, to_date_str, iter_sale_list_pages, fetch_sale_list_total)
+    return iter_sale_list_pages()
+
+def get_recent_sale_details(from_date_str, to_date_str):
+    all_extracted_details = []
+    
+    # Convert string dates to datetime objects for comparison
+    from_date = datetime.strptime(from_date_str, "%Y-%m-%d")
+    to_date = datetime.strptime(to_date_str, "%Y-%m-%d") + timedelta(days=1)  # Include the entire end day
+
+    log.info(f"Fetching sales from {from_date_str} to {to_date_str} with pagination...")
+
+    for sales_from_list in iter_window_pages(from_date_str, to_date_str):
+        with stage("filter"):
+            all_extracted_details.extend(extract_sales_in_window(sales_from_list, from_date, to_date))
+    
+    log.info(f"Found {len(all_extracted_details)} sales within the specified date range.")
+    return all_extracted_details
+
+# === DATE FORMATTING FOR AdditionalAttribute2 ===
+def format_order_date_for_attribute(order_date_full_str):
+    """Reformat a SaleList OrderDate (e.g. "2025-06-19T00:00:00") to MM/DD/YYYY."""
+    if not order_date_full_str:
+        return None
+    date_part_str = order_date_full_str.split('T')[0] # e.g., "2025-06-19"
+    try:
+        dt_obj = datetime.strptime(date_part_str, "%Y-%m-%d")
+        return dt_obj.strftime("%m/%d/%Y") # Format to MM/DD/YYYY
+    except ValueError:
+        log.warning(f"Could not parse date '{date_part_str}'. Falling back to default YYYY-MM-DD format.")
+        return date_part_str # Fallback if parsing fails
+
+# === STEP 2: UPDATE AdditionalAttributes.OrderDate ===
+def get_existing_stamp(detailed_sale_data):
+    """Return the current AdditionalAttribute2 value, or None if it is missing or blank."""
+    # 1. Check if 'AdditionalAttributes' key exists and is a dictionary
+    if "AdditionalAttributes" in detailed_sale_data and \
+       isinstance(detailed_sale_data["AdditionalAttributes"], dict):
+        
+        # 2. Then, safely get 'AdditionalAttribute2' value
+        current_attr2_value = detailed_sale_data["AdditionalAttributes"].get("AdditionalAttribute2")
+
+        # 3. Check if the value is not None AND not an empty string (after stripping whitespace)
+        if current_attr2_value is not None and str(current_attr2_value).strip() != "":
+            return current_attr2_value
+    return None
+
+def build_update_payload(essential_sale_details, detailed_sale_data):
+    """Merge SaleList and /sale/order data into a PUT body with AdditionalAttribute2 set.
+
+    Returns (payload, formatted_date), or (None, error_message) if the sale cannot be written.
+    """
+    sale_id = essential_sale_details["SaleID"]
+
+    # Combine essential details from SaleList with detailed_sale_data
+    essential_for_put = {k: v for k, v in essential_sale_details.items() if k not in LIST_ONLY_FIELDS}
+    sale_data_for_put = {**essential_for_put, **detailed_sale_data}
+
+    # Ensure the 'ID' field is present for the PUT request
+    if "ID" not in sale_data_for_put and "SaleID" in sale_data_for_put:
+        sale_data_for_put["ID"] = sale_data_for_put["SaleID"]
+    elif "ID" not in sale_data_for_put and "SaleID" not in sale_data_for_put:
+        message = f"Sale {sale_id} data missing both 'ID' and 'SaleID' for PUT request after merging."
+        sale_quarantine.record_failure(essential_sale_details, "build", None, message, kind="permanent")
+        return None, message
+
+    # Complete a missing CustomerID / Customer name from the local directory (filled in up front by prepare)
+    customer_fix = customer_directory.complete(sale_data_for_put)
+    if customer_fix:
+        log.info(f"Sale {sale_id}: {customer_fix}")
+
+    # Ensure CustomerID or Customer name is present (critical for PUT requests)
+    if not sale_data_for_put.get("CustomerID") and not sale_data_for_put.get("Customer"):
+        message = f"Sale {sale_id} data missing 'CustomerID' or 'Customer' even after merging for PUT request."
+        sale_quarantine.record_failure(essential_sale_details, "build", None, message, kind="permanent")
+        return None, message
+
+    # Get OrderDate from the essential details and reformat it to MM/DD/YYYY
+    original_order_date_full_str = essential_sale_details.get("OrderDate")
+    formatted_date_for_attr = format_order_date_for_attribute(original_order_date_full_str)
+    if formatted_date_for_attr:
+        log.debug("OrderDate from SaleList: %s. Formatted for attribute: %s", original_order_date_full_str, formatted_date_for_attr)
+
+    if not formatted_date_for_attr: # If original was empty or parsing failed
+        # Fallback to current date if OrderDate is unexpectedly missing or couldn't be parsed
+        formatted_date_for_attr = datetime.now().strftime("%m/%d/%Y")
+        log.info(f"Sale {sale_id} has no valid OrderDate in SaleList. Using current formatted date: {formatted_date_for_attr}")
+
+    # Ensure AdditionalAttributes exists and is a dictionary before setting
+    # This block is somewhat redundant after the skip check, but acts as a final safeguard
+    if "AdditionalAttributes" not in sale_data_for_put or sale_data_for_put["AdditionalAttributes"] is None:
+        sale_data_for_put["AdditionalAttributes"] = {}
+    
+    if not isinstance(sale_data_for_put["AdditionalAttributes"], dict):
+        log.warning(f"AdditionalAttributes for sale {sale_id} is not a dictionary. Overwriting.")
+        sale_data_for_put["AdditionalAttributes"] = {}
+
+    # Set the date for AdditionalAttribute2 with the MM/DD/YYYY format
+    sale_data_for_put["AdditionalAttributes"]["AdditionalAttribute2"] = formatted_date_for_attr
+    log.debug("Set 'AdditionalAttributes.AdditionalAttribute2' to: %s", formatted_date_for_attr)
+    return sale_data_for_put, formatted_date_for_attr
+
+def should_skip_existing_stamp(essential_sale_details, detailed_sale_data, stamp_cache=None, overwrite_mismatched=False):
+    """True if AdditionalAttribute2 is already filled in and should be left alone."""
+    sale_id = essential_sale_details["SaleID"]
+    current_attr2_value = get_existing_stamp(detailed_sale_data)
+    order_date = essential_sale_details.get("OrderDate")
+    if current_attr2_value is None:
+        # Cache the blank too: if the PUT that follows fails, the audit sees it as unstamped
+        record_stamp(stamp_cache, sale_id, order_date, "")
+        return False
+    record_stamp(stamp_cache, sale_id, order_date, current_attr2_value)
+    stamped_sales.add(sale_id)
+    if not overwrite_mismatched or stamp_matches_order_date(current_attr2_value, order_date):
+        log.debug("[SKIP] AdditionalAttribute2 for Sale %s already has value '%s'. Skipping update.", sale_id, current_attr2_value)
+        sale_quarantine.release(sale_id, "is stamped now; released from quarantine")
+        return True
+    log.info(f"AdditionalAttribute2 '{current_attr2_value}' for Sale {sale_id} does not match OrderDate {order_date}. Overwriting.")
+    return False
+
+def handle_put_response(essential_sale_details, put_response, sale_data_for_put, formatted_date_for_attr, stamp_cache=None):
+    sale_id = essential_sale_details["SaleID"]
+    order_number = essential_sale_details.get("OrderNumber", "N/A")
+    if put_response.status_code == 200:
+        # Our own write changed the document, so the cached copy is stale
+        sale_document_cache.evict(sale_id)
+        log.debug("Sale %s (Order %s) updated with date %s in AdditionalAttribute2.", sale_id, order_number, formatted_date_for_attr)
+        record_stamp(stamp_cache, sale_id, essential_sale_details.get("OrderDate"), formatted_date_for_attr)
+        stamped_sales.add(sale_id)
+        sale_quarantine.release(sale_id, "updated; released from quarantine")
+        change_feed.publish_stamped(essential_sale_details, formatted_date_for_attr)
+        return "updated"
+    log.error(f"PUT sale {sale_id} (Order {order_number}) failed: {put_response.status_code} - {put_response.text}")
+    sale_quarantine.record_failure(essential_sale_details, "sale_put", put_response.status_code, put_response.text)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Payload sent for %s: %s", sale_id, json.dumps(sale_data_for_put, separators=(",", ":")))
+    return "failed"
+
+def fetch_sale_document(essential_sale_details):
+    """GET /sale/order through the sale document cache.
+
+    Returns (detailed_sale_data, None) or (None, error_text).
+    """
+    sale_id = essential_sale_details["SaleID"]
+    list_updated = essential_sale_details.get("Updated")
+    cached = sale_document_cache.get(sale_id)
+    if sale_document_cache.is_fresh_for_listing(cached, list_updated):
+        sale_document_cache.count("fresh_hits")
+        log.debug("Using cached sale record for %s (unchanged since %s).", sale_id, list_updated)
+        return json.loads(cached["body"]), None
+
+    get_url = f"{API_BASE_URL}/sale/order?SaleID={sale_id}"
+    log.debug("Fetching full sale record for update from: %s", get_url)
+    response = send_dear_request("GET", get_url, "sale_get", sale_id=sale_id,
+                                 headers=sale_document_cache.conditional_headers(cached))
+
+    if response.status_code == 304 and cached:
+        sale_document_cache.count("not_modified")
+        sale_document_cache.refresh_listing_timestamp(sale_id, cached, list_updated)
+        return json.loads(cached["body"]), None
+    if response.status_code != 200:
+        sale_quarantine.record_failure(essential_sale_details, "sale_get", response.status_code, response.text)
+        return None, f"{response.status_code} - {response.text}"
+
+    sale_document_cache.count("misses")
+    with stage("json_decode"):
+        detailed_sale_data = response.json()
+    sale_document_cache.store(sale_id, response.text, response.headers, list_updated)
+    return detailed_sale_data, None
+
+# Returns "updated", "skipped" or "failed" so callers (e.g. the audit) can summarise a run.
+# stamp_cache, when given, is updated with the AdditionalAttribute2 value seen or written.
+# overwrite_mismatched lets an existing stamp be replaced if it does not match the OrderDate.
+# Sales held in quarantine (quarantine.py) are skipped without any call.
+def update_order_date_for_sale(essential_sale_details, stamp_cache=None, overwrite_mismatched=False):
+    sale_id = essential_sale_details["SaleID"]
+    order_number = essential_sale_details.get("OrderNumber", "N/A")
+    if sale_quarantine.holds(essential_sale_details):
+        return "skipped"
+
+    try:
+        log.debug("Processing SaleID: %s, OrderNumber: %s", sale_id, order_number)
+        detailed_sale_data, error = fetch_sale_document(essential_sale_details)
+
+        if detailed_sale_data is None:
+            log.error(f"GET sale {sale_id} failed: {error}")
+            return "failed"
+
+        # --- DEBUG: Print the full detailed_sale_data to inspect AdditionalAttributes ---
+        # Comment this out for production runs to reduce log verbosity
+        # print(f"  [DEBUG] Full detailed_sale_data for {sale_id}:\n{json.dumps(detailed_sale_data, indent=2)}")
+        # --- END DEBUG ---
+
+        # --- Skip sales whose AdditionalAttribute2 is already filled in ---
+        if should_skip_existing_stamp(essential_sale_details, detailed_sale_data, stamp_cache, overwrite_mismatched):
+            return "skipped" # Skip the rest of the function for this order
+
+        with stage("build_payload"):
+            sale_data_for_put, formatted_date_for_attr = build_update_payload(essential_sale_details, detailed_sale_data)
+        if sale_data_for_put is None:
+            log.error(formatted_date_for_attr)
+            return "failed"
+
+        put_url = f"{API_BASE_URL}/sale"
+        log.debug("Attempting to update sale %s via PUT...", sale_id)
+        put_response = send_dear_request("PUT", put_url, "sale_put", sale_id=sale_id, json=sale_data_for_put)
+        return handle_put_response(essential_sale_details, put_response, sale_data_for_put, formatted_date_for_attr, stamp_cache)
+    except Exception as e:
+        log.error(f"Sale {sale_id} (Order {order_number}) failed: {e}")
+        return "failed"
+
+# === PER-SALE RESULT HOOK ===
+def report_sale_result(sale, status, stamp_cache=None):
+    """Every engine calls this once per processed sale: one summary log record, plus the columnar export."""
+    entry = stamp_cache.get(sale["SaleID"]) if stamp_cache and status != "failed" else None
+    stamp = entry.get("AdditionalAttribute2") if entry else None
+    log_sale(sale, status, stamp)
+    freshness.record(sale, status, stamp)
+    if sale_exporter.enabled:
+        sale_exporter.record(sale, status, stamp)
+
+# === SYNC ENGINE ===
+def run_sync_engine(from_str, to_str, stamp_cache=None):
+    """Blocking engine: list the window, then process one sale at a time."""
+    sale_details_to_process = get_recent_sale_details(from_str, to_str)
+    log.info(f"Found {len(sale_details_to_process)} sales in the selected date range.")
+    customer_directory.prepare(sale_details_to_process, iter_customer_pages)
+
+    results = {"updated": 0, "skipped": 0, "failed": 0}
+    if not sale_details_to_process:
+        log.info("No sales to process for the selected date range. Exiting.")
+    for sale_detail in sale_details_to_process:
+        status = update_order_date_for_sale(sale_detail, stamp_cache=stamp_cache)
+        results[status] += 1
+        report_sale_result(sale_detail, status, stamp_cache)
+    return results
+
+def print_run_summary(engine, results, elapsed_seconds):
+    processed = sum(results.values())
+    calls_per_sale = rate_limiter.calls / processed if processed else 0.0
+    print(f"\n=== RUN SUMMARY ({engine} engine) ===")
+    print(f"  Sales processed: {processed} ({results['updated']} updated, {results['skipped']} skipped, {results['failed']} failed)")
+    print(f"  API calls:       {rate_limiter.calls} ({calls_per_sale:.2f} per sale)")
+    print(f"  Wall time:       {elapsed_seconds:.2f}s")
+    cache_stats = sale_document_cache.stats
+    print(f"  Sale cache:      {cache_stats['fresh_hits']} unchanged (no request), {cache_stats['not_modified']} "
+          f"304 Not Modified, {cache_stats['misses']} full downloads, {cache_stats['evictions']} evictions")
+    list_stats = salelist_cache.stats
+    print(f"  SaleList cache:  {list_stats['full_refreshes']} full, {list_stats['delta_refreshes']} delta "
+          f"({list_stats['changed_sales']} changed sales), {list_stats['served_without_calls']} served without calls")
+    for listing in page_size_tuner.choices:
+        print(f"  SaleList Limit:  {listing['page_size']} for {listing['pages']} pages / {listing['rows']} sales "
+              f"({listing['reason']})")
+    quarantine_stats = sale_quarantine.stats
+    if any(quarantine_stats.values()):
+        print(f"  Quarantine:      {quarantine_stats['held']} held (no calls), {quarantine_stats['quarantined']} newly "
+              f"failed permanently, {quarantine_stats['rechecked']} re-checked, {quarantine_stats['released']} released, "
+              f"{quarantine_stats['transient']} transient failures (see `verve quarantine`)")
+    stamped_stats = stamped_sales.stats
+    if any(stamped_stats.values()):
+        print(f"  Stamped set:     {len(stamped_sales)} SaleIDs, {stamped_stats['hits']} known stamped without a GET, "
+              f"{stamped_stats['added']} added, {stamped_stats['compactions']} compactions")
+    fresh = freshness.report()
+    if fresh["days"]:
+        stamped = fresh["latency_seconds"]["count"]
+        latency = f" (order to stamp {format_latency(fresh['latency_seconds'])})" if stamped else ""
+        print(f"  Freshness:       {stamped} stamped{latency}; backlog {fresh['backlog']} unstamped "
+              f"(oldest {format_age(fresh['oldest_backlog_seconds'])}), {fresh['mismatched']} mismatched")
+    if change_feed.enabled:
+        print(f"  Change feed:     {change_feed.stats['listed']} listed, {change_feed.stats['stamped']} stamped events "
+              f"to {' and '.join(filter(None, (change_feed.path, change_feed.socket_path)))}")
+    customer_stats = customer_directory.stats
+    if any(customer_stats.values()):
+        print(f"  Customer dir:    {customer_stats['completed']} completed, "
+              f"{customer_stats['unresolved']} unresolved, {customer_stats['api_pages']} /customer pages")
+    concurrency = concurrency_limiter.report()
+    if concurrency["enabled"] and concurrency["responses"]:
+        cuts = ", ".join(f"{count} {reason}" for reason, count in sorted(concurrency["decreases"].items())) or "none"
+        print(f"  Concurrency:     limit {concurrency['limit']} (started {concurrency['initial']}, range "
+              f"{concurrency['low_limit']}-{concurrency['peak_limit']}, cuts: {cuts}), "
+              f"peak {concurrency['peak_in_flight']} in flight")
+    dropped = sampling_report()
+    if dropped:
+        print(f"  Log sampling:    dropped {', '.join(f'{count} {key}' for key, count in sorted(dropped.items()))} records "
+              f"(use --log-sample-every 1 to keep all)")
+    print("  Time by stage:")
+    for line in format_stage_table().splitlines():
+        print(f"    {line}")
+
+# === MAIN EXECUTION ===
+def build_parser(prog=None, description="Stamp Dear sales' OrderDate into AdditionalAttribute2."):
+    parser = argparse.ArgumentParser(prog=prog, description=description)
+    parser.add_argument("--from-date", help="Start of the window (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument("--to-date", help="End of the window (YYYY-MM-DD). Defaults to --from-date.")
+    parser.add_argument("--engine", choices=("sync", "async", "pipeline"), default="sync",
+                        help="sync: one blocking request at a time. async: many sales in flight on one event loop. "
+                             "pipeline: list/decide/fetch/build/PUT stages joined by bounded queues.")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="With --engine async, the maximum number of sales processed concurrently.")
+    parser.add_argument("--stage-workers", default=None,
+                        help="With --engine pipeline, workers per stage, e.g. 'fetch=8,put=4'.")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="With --engine pipeline, the bound on every inter-stage queue.")
+    parser.add_argument("--profile", action="store_true",
+                        help="cProfile/tracemalloc each stage and write the results to profile_output/.")
+    parser.add_argument("--slow-threshold", type=float, default=None,
+                        help="Log any request slower than this many seconds (default VERVE_SLOW_REQUEST_SECONDS or 5).")
+    parser.add_argument("--record", metavar="CASSETTE", default=None,
+                        help="Record every Dear exchange (credentials scrubbed) to this cassette file.")
+    parser.add_argument("--replay", metavar="CASSETTE", default=None,
+                        help="Serve every Dear call from this cassette instead of the network.")
+    parser.add_argument("--no-sale-cache", action="store_true",
+                        help="Always download /sale/order in full instead of using the on-disk sale cache.")
+    parser.add_argument("--no-salelist-cache", action="store_true",
+                        help="Page the full SaleList from the API instead of using the per-day SaleList cache.")
+    parser.add_argument("--export-dir", default=None,
+                        help="Append every listed sale and its stamp result to a day-partitioned Parquet dataset here.")
+    parser.add_argument("--change-feed", metavar="FILE", default=None,
+                        help="Append every changed listed sale and every stamp written, as JSON events, to this file "
+                             "(default VERVE_CHANGE_FEED_FILE; `verve feed` reads it).")
+    parser.add_argument("--change-feed-socket", metavar="PATH", default=None,
+                        help="Also send the events to a consumer listening on this Unix socket "
+                             "(default VERVE_CHANGE_FEED_SOCKET).")
+    parser.add_argument("--log-level", default=None, choices=("DEBUG", "INFO", "WARNING", "ERROR"),
+                        help="DEBUG adds the per-sale step lines (default VERVE_LOG_LEVEL or INFO).")
+    parser.add_argument("--log-format", default=None, choices=("text", "json"),
+                        help="json writes one JSON object per log line (default VERVE_LOG_FORMAT or text).")
+    parser.add_argument("--log-sample-every", type=int, default=None,
+                        help="After the first few, keep one in N skipped-sale and page records (1 keeps all).")
+    parser.add_argument("--plan", action="store_true",
+                        help="Dry run: list the window, classify sales from the stamp cache and print the calls and "
+                             "time a real run needs. No sale is fetched or updated.")
+    parser.add_argument("--audit", action="store_true",
+                        help="Compare cached stamps against OrderDate and only fix the sales that need it.")
+    parser.add_argument("--audit-include-unknown", action="store_true",
+                        help="With --audit, also process sales that are not in the stamp cache yet.")
+    parser.add_argument("--report-only", action="store_true",
+                        help="With --audit, print the report without issuing any updates.")
+    return parser
+
+
+def parse_args(argv=None, prog=None):
+    return build_parser(prog).parse_args(argv)
+
+
+def disable_local_state():
+    """Keep every local store out of the run, for replays and benchmarks: no cache hit skips a request,
+    nothing is loaded from or written to disk, and no change-feed events are published."""
+    sale_document_cache.enabled = False
+    salelist_cache.enabled = False
+    page_size_tuner.enabled = False
+    customer_directory.path = None  # in memory only, so it asks for every /customer page it needs
+    sale_quarantine.enabled = False
+    stamped_sales.enabled = False
+    snapshot.enabled = False
+    freshness.enabled = False
+    change_feed.path = change_feed.socket_path = None
+
+
+def save_run_state(stamp_cache, engine, from_str, to_str):
+    """Persist every local store and flush the export: the one teardown for sync runs and --audit, error or not."""
+    save_stamp_cache(stamp_cache)
+    customer_directory.save()
+    freshness.save({"engine": engine, "from": from_str, "to": to_str, "calls": rate_limiter.calls,
+                    "concurrency_limit": concurrency_limiter.report()["limit"]})
+    sale_quarantine.save()
+    stamped_sales.save()
+    change_feed.close()
+    if sale_exporter.enabled:
+        from verve.sale_export import compact_export
+
+        sale_exporter.flush()
+        compacted = compact_export(sale_exporter.directory, run_tag=sale_exporter.run_tag)
+        print(f"\nExported {sale_exporter.rows_written} rows to {sale_exporter.directory} "
+              f"({compacted} day partitions compacted).")
+
+
+def run(args):
+    """One invocation of the script (or of `verve sync` / `verve audit`) with parsed arguments."""
+    from verve import structured_log
+    configure_logging(args.log_level or structured_log.LOG_LEVEL, args.log_format or structured_log.LOG_FORMAT,
+                      sample_every=args.log_sample_every or structured_log.LOG_SAMPLE_EVERY)
+
+    # Date range for SaleList - defaults to today's date
+    today = datetime.today()
+    from_str = args.from_date or today.strftime("%Y-%m-%d")
+    to_str = args.to_date or from_str
+
+    if args.replay:
+        window = http_recorder.load_cassette(args.replay)
+        # Replays default to the window that was recorded
+        from_str = args.from_date or window.get("from", from_str)
+        to_str = args.to_date or window.get("to", to_str)
+    elif args.record:
+        http_recorder.start_recording(from_str, to_str, args.record)
+
+    stamp_cache = load_stamp_cache()
+    if args.no_sale_cache:
+        sale_document_cache.enabled = False
+    if args.no_salelist_cache:
+        salelist_cache.enabled = False
+    if args.export_dir:
+        sale_exporter.directory = args.export_dir
+    if sale_exporter.enabled and not pyarrow_available():
+        raise SystemExit(MISSING_PYARROW_MESSAGE)
+    if args.change_feed:
+        change_feed.path = args.change_feed
+    if args.change_feed_socket:
+        change_feed.socket_path = args.change_feed_socket
+    if args.replay:
+        # A replay must issue exactly the recorded requests, and recorded sales are not news
+        disable_local_state()
+
+    from verve import profiling
+    if args.slow_threshold is not None:
+        profiling.SLOW_REQUEST_THRESHOLD_SECONDS = args.slow_threshold
+    if args.profile:
+        profiling.enable_profiling()
+
+    if args.plan:
+        from verve.planner import run_plan
+
+        print(f"Planning {args.engine} run for {from_str} to {to_str} ({len(stamp_cache)} sales in stamp cache)...")
+        try:
+            run_plan(from_str, to_str, stamp_cache, args.engine)
+        finally:
+            change_feed.close()
+        print("\nScript finished.")
+        return None
+
+    if args.audit:
+        from verve.audit import run_audit
+
+        print(f"Starting stamp audit for {from_str} to {to_str} ({len(stamp_cache)} sales in stamp cache)...")
+        try:
+            run_audit(from_str, to_str, stamp_cache, fix=not args.report_only,
+                      include_unknown=args.audit_include_unknown)
+        finally:
+            save_run_state(stamp_cache, "audit", from_str, to_str)
+        if args.profile:
+            profiling.write_profile_report()
+        print("\nScript finished.")
+        return None
+
+    print(f"Starting script to process sales for {from_str} to {to_str} ({args.engine} engine)...")
+
+    # <<< NEW: Add an initial delay BEFORE the very first API call >>>
+    # This ensures your first call doesn't hit a limit if the previous minute was active.
+    time.sleep(API_CALL_DELAY_SECONDS) 
+
+    if not args.replay:
+        from verve.planner import RUN_METRICS_FILE, load_json
+
+        concurrency_limiter.warm_start(((load_json(RUN_METRICS_FILE) or {}).get("concurrency") or {}).get("limit"))
+
+    rate_limiter.calls = 0
+    started = time.perf_counter()
+    try:
+        if args.engine == "async":
+            from verve.async_client import ASYNC_MAX_IN_FLIGHT, run_async_sync
+
+            # Coroutines interleave, so the async engine is profiled as a single stage
+            with stage("async_run"):
+                results = run_async_sync(from_str, to_str, stamp_cache, args.max_in_flight or ASYNC_MAX_IN_FLIGHT)
+        elif args.engine == "pipeline":
+            from verve.pipeline import PIPELINE_QUEUE_SIZE, parse_stage_workers, run_pipeline_engine
+
+            results = run_pipeline_engine(from_str, to_str, stamp_cache, parse_stage_workers(args.stage_workers),
+                                          args.queue_size or PIPELINE_QUEUE_SIZE)
+        else:
+            results = run_sync_engine(from_str, to_str, stamp_cache)
+    finally:
+        save_run_state(stamp_cache, args.engine, from_str, to_str)
+    elapsed = time.perf_counter() - started
+    flush_logs()
+    print_run_summary(args.engine, results, elapsed)
+
+    from verve.planner import record_run_metrics, validate_plan_against_run
+    validate_plan_against_run(from_str, to_str, args.engine, rate_limiter.calls, elapsed)
+    record_run_metrics(args.engine, rate_limiter.calls, elapsed)
+    if args.profile:
+        profiling.write_profile_report()
+
+    print("\nScript finished.")
+    return results
+
+
+def run_cli(argv=None, prog=None):
+    return run(parse_args(argv, prog))
+
+
+if __name__ == "__main__":
+    run_cli()
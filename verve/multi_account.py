@@ -0,0 +1,152 @@
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import time
+from datetime import datetime
+
+# === MULTI-ACCOUNT FAN-OUT ===
+# Runs the stamping job for several Dear tenants from one invocation. Each account gets its own
+# process, and therefore its own credentials, stamp cache and rate limiter: Dear's quota is per
+# account, so N accounts finish in about the time of the slowest one rather than the sum.
+#
+# accounts.json (keep it out of git, it holds API keys):
+#   [{"name": "acme", "account_id": "...", "api_key": "..."}, ...]
+# Optional per-account keys: "base_url" (e.g. the mock server) and "engine" ("sync"/"async").
+#
+#   python -m verve.multi_account --accounts accounts.json [--engine async] [--max-workers N]
+
+ACCOUNTS_FILE = os.getenv("VERVE_ACCOUNTS_FILE", "accounts.json")
+ACCOUNT_LOG_DIR = "account_logs"
+
+
+def load_accounts(path=ACCOUNTS_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        accounts = json.load(f)
+    for i, account in enumerate(accounts):
+        if not account.get("account_id") or not account.get("api_key"):
+            raise ValueError(f"Account #{i + 1} in {path} is missing 'account_id' or 'api_key'")
+        account.setdefault("name", account["account_id"])
+    return accounts
+
+
+def sync_account(job):
+    """Worker entry point. Runs in a fresh process, so main.py picks up this account's settings on import."""
+    account, from_str, to_str, engine, log_dir = job
+    name = account["name"]
+    os.environ["DEAR_ACCOUNT_ID"] = account["account_id"]
+    os.environ["DEAR_API_KEY"] = account["api_key"]
+    if account.get("base_url"):
+        os.environ["DEAR_API_BASE_URL"] = account["base_url"]
+    os.environ["VERVE_STAMP_CACHE_FILE"] = f"stamp_cache_{name}.json"
+    os.environ["VERVE_SALELIST_CACHE_DIR"] = f"salelist_cache_{name}"
+    os.environ["VERVE_SALE_CACHE_DIR"] = f"sale_cache_{name}"
+    os.environ["VERVE_PLAN_FILE"] = f"last_plan_{name}.json"
+    os.environ["VERVE_RUN_METRICS_FILE"] = f"last_run_metrics_{name}.json"
+    os.environ["VERVE_PAGE_TUNING_FILE"] = f"page_tuning_{name}.json"
+    os.environ["VERVE_CUSTOMER_DIRECTORY_FILE"] = f"customer_directory_{name}.json"
+    os.environ["VERVE_QUARANTINE_FILE"] = f"quarantine_{name}.json"
+    os.environ["VERVE_STAMPED_SET_FILE"] = f"stamped_sales_{name}.bin"
+    os.environ["VERVE_SNAPSHOT_FILE"] = f"verve_state_{name}.snap"
+    os.environ["VERVE_FRESHNESS_FILE"] = f"freshness_history_{name}.jsonl"
+    if os.getenv("VERVE_CHANGE_FEED_FILE"):
+        feed_root, feed_ext = os.path.splitext(os.environ["VERVE_CHANGE_FEED_FILE"])
+        os.environ["VERVE_CHANGE_FEED_FILE"] = f"{feed_root}_{name}{feed_ext}"
+
+    os.makedirs(log_dir, exist_ok=True)
+    log_path = os.path.join(log_dir, f"{name}.log")
+    outcome = {"name": name, "log": log_path, "results": None, "calls": 0, "elapsed": 0.0, "error": None}
+
+    started = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            from verve import main
+            from verve.planner import record_run_metrics
+            from verve.rate_limit import rate_limiter
+            from verve.stamp_cache import load_stamp_cache
+
+            account_engine = account.get("engine") or engine
+            stamp_cache = load_stamp_cache()
+            try:
+                if account_engine == "async":
+                    from verve.async_client import run_async_sync
+
+                    outcome["results"] = run_async_sync(from_str, to_str, stamp_cache)
+                else:
+                    outcome["results"] = main.run_sync_engine(from_str, to_str, stamp_cache)
+            finally:
+                main.save_run_state(stamp_cache, account_engine, from_str, to_str)
+            outcome["calls"] = rate_limiter.calls
+            record_run_metrics(account_engine, rate_limiter.calls, time.perf_counter() - started)
+        except Exception as e:
+            print(f"[EXCEPTION] Account {name} failed: {e}")
+            outcome["error"] = str(e)
+        finally:
+            # Records still queued must reach this account's log, not the parent's stdout
+            from verve.structured_log import flush_logs
+
+            flush_logs()
+    outcome["elapsed"] = time.perf_counter() - started
+    return outcome
+
+
+def run_multi_account(accounts, from_str, to_str, engine="sync", max_workers=None, log_dir=ACCOUNT_LOG_DIR):
+    jobs = [(account, from_str, to_str, engine, log_dir) for account in accounts]
+    # spawn + one task per child: every account starts from a clean interpreter and never
+    # inherits another tenant's imported credentials or rate limiter state.
+    context = multiprocessing.get_context("spawn")
+    outcomes = []
+    with context.Pool(processes=max_workers or len(accounts), maxtasksperchild=1) as pool:
+        for outcome in pool.imap_unordered(sync_account, jobs):
+            status = "FAILED" if outcome["error"] else "done"
+            print(f"  [{status}] {outcome['name']} in {outcome['elapsed']:.1f}s (log: {outcome['log']})")
+            outcomes.append(outcome)
+    return outcomes
+
+
+def print_multi_account_summary(outcomes, elapsed_seconds):
+    totals = {"updated": 0, "skipped": 0, "failed": 0}
+    total_calls = 0
+    print("\n=== MULTI-ACCOUNT SUMMARY ===")
+    print(f"  {'account':<20}{'updated':>9}{'skipped':>9}{'failed':>8}{'calls':>8}{'wall (s)':>10}")
+    for outcome in sorted(outcomes, key=lambda o: o["name"]):
+        results = outcome["results"] or {"updated": 0, "skipped": 0, "failed": 0}
+        for key in totals:
+            totals[key] += results[key]
+        total_calls += outcome["calls"]
+        suffix = f"  ERROR: {outcome['error']}" if outcome["error"] else ""
+        print(f"  {outcome['name']:<20}{results['updated']:>9}{results['skipped']:>9}{results['failed']:>8}"
+              f"{outcome['calls']:>8}{outcome['elapsed']:>10.1f}{suffix}")
+    slowest = max((o["elapsed"] for o in outcomes), default=0.0)
+    summed = sum(o["elapsed"] for o in outcomes)
+    print(f"  {'TOTAL':<20}{totals['updated']:>9}{totals['skipped']:>9}{totals['failed']:>8}{total_calls:>8}")
+    print(f"  Wall time: {elapsed_seconds:.1f}s (slowest account {slowest:.1f}s, sequential would be ~{summed:.1f}s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the OrderDate stamping job for several Dear accounts in parallel.")
+    parser.add_argument("--accounts", default=ACCOUNTS_FILE, help="JSON file with the account credentials.")
+    parser.add_argument("--from-date", help="Start of the window (YYYY-MM-DD). Defaults to today.")
+    parser.add_argument("--to-date", help="End of the window (YYYY-MM-DD). Defaults to --from-date.")
+    parser.add_argument("--engine", choices=("sync", "async"), default="sync")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Maximum accounts processed at once. Defaults to one process per account.")
+    parser.add_argument("--log-dir", default=ACCOUNT_LOG_DIR)
+    args = parser.parse_args()
+
+    from_str = args.from_date or datetime.today().strftime("%Y-%m-%d")
+    to_str = args.to_date or from_str
+
+    from verve.sale_export import MISSING_PYARROW_MESSAGE, pyarrow_available, sale_exporter
+
+    if sale_exporter.enabled and not pyarrow_available():
+        raise SystemExit(MISSING_PYARROW_MESSAGE)
+    accounts = load_accounts(args.accounts)
+    print(f"Syncing {len(accounts)} accounts for {from_str} to {to_str} ({args.engine} engine)...")
+    started = time.perf_counter()
+    outcomes = run_multi_account(accounts, from_str, to_str, args.engine, args.max_workers, args.log_dir)
+    print_multi_account_summary(outcomes, time.perf_counter() - started)
+
+    if any(outcome["error"] for outcome in outcomes):
+        raise SystemExit(1)
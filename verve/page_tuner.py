@@ -0,0 +1,193 @@
+import json
+import os
+import time
+
+from verve.rate_limit import rate_limiter
+from verve.state_snapshot import read_state
+
+# === /salelist PAGE SIZE TUNING ===
+# Bigger pages cost fewer rate-limited calls but take longer and return bigger bodies. Each listing
+# measures latency and bytes per page for the Limit it used and keeps the numbers in
+# PAGE_TUNING_FILE, and the next listing uses the Limit that lists the most sales per second:
+#   seconds per page = max(measured latency, rate-limit interval)   (pages are fetched one by one)
+#   sales per second = page size / seconds per page
+# Sizes within PAGE_SCORE_TIE_FRACTION of the best count as a tie, and the larger one wins because
+# it spends less quota. Sizes slower than PAGE_MAX_LATENCY_SECONDS are never picked.
+#
+# Candidates that have never been measured are tried in ascending order, one listing at a time,
+# and every PAGE_REPROBE_EVERY listings a neighbour of the best size is re-measured so the choice
+# follows the API as it gets faster or slower. Only full pages (rows == Limit) are scored, since a
+# short last page says nothing about the cost of a full one.
+
+PAGE_TUNING_FILE = os.getenv("VERVE_PAGE_TUNING_FILE", "page_tuning.json")
+DEFAULT_PAGE_SIZE = 100
+SALELIST_MAX_PAGE_SIZE = 1000  # largest Limit the Dear API accepts
+PAGE_SIZE_CANDIDATES = (100, 200, 500, 1000)
+PAGE_MAX_LATENCY_SECONDS = 20
+PAGE_SCORE_TIE_FRACTION = 0.1
+PAGE_REPROBE_EVERY = 10
+EWMA_WEIGHT = 0.3  # weight of the newest page in the running averages
+
+
+class PageSizeTuner:
+    def __init__(self, path=PAGE_TUNING_FILE, candidates=PAGE_SIZE_CANDIDATES, enabled=True):
+        self.path = path
+        self.candidates = sorted(size for size in candidates if size <= SALELIST_MAX_PAGE_SIZE)
+        self.enabled = enabled
+        self.state = None
+        self.choices = []  # this run's listings: {"page_size", "reason", "pages", "rows", "full_listing"}
+
+    # --- storage ---
+
+    def _load(self):
+        if self.state is None:
+            try:
+                self.state = json.loads(read_state(self.path) or b"{}")
+            except (OSError, ValueError):
+                self.state = {}
+            self.state.setdefault("sizes", {})
+            self.state.setdefault("listings", 0)
+        return self.state
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    # --- scoring ---
+
+    def _stats(self, size):
+        return self._load()["sizes"].get(str(size))
+
+    def seconds_per_page(self, size):
+        stats = self._stats(size)
+        if not stats or not stats.get("full_pages"):
+            return None
+        return max(stats["latency_seconds"], rate_limiter.min_interval_seconds)
+
+    def sales_per_second(self, size):
+        seconds = self.seconds_per_page(size)
+        if seconds is None:
+            return None
+        return size / seconds if seconds > 0 else float("inf")
+
+    def _usable(self, size):
+        stats = self._stats(size)
+        return bool(stats and stats.get("full_pages")) and stats["latency_seconds"] <= PAGE_MAX_LATENCY_SECONDS
+
+    def _best(self):
+        scored = [(self.sales_per_second(size), size) for size in self.candidates if self._usable(size)]
+        if not scored:
+            return None
+        top = max(score for score, _ in scored)
+        # Near-ties go to the larger page: same speed, fewer calls against the quota
+        return max(size for score, size in scored if score >= top * (1 - PAGE_SCORE_TIE_FRACTION))
+
+    def _next_unmeasured(self):
+        for size in self.candidates:
+            stats = self._stats(size)
+            if stats and stats.get("full_pages"):
+                if stats["latency_seconds"] > PAGE_MAX_LATENCY_SECONDS:
+                    return None  # already too slow; larger pages only get slower
+                continue
+            if stats and stats.get("short_listings"):
+                return None  # the account cannot fill a page this big, so larger sizes cannot matter
+            return size
+        return None
+
+    def _neighbour(self, size):
+        index = self.candidates.index(size)
+        for candidate in self.candidates[index + 1:index + 2] + self.candidates[max(index - 1, 0):index]:
+            stats = self._stats(candidate) or {}
+            if not stats.get("short_listings"):
+                return candidate
+        return None
+
+    # --- public API ---
+
+    def choose(self, explore=True):
+        """Page size for the next listing, with the reason it was picked.
+
+        explore=False (filtered listings such as UpdatedSince deltas) always uses the best known size.
+        """
+        if not self.enabled:
+            return DEFAULT_PAGE_SIZE, "tuning disabled"
+        state = self._load()
+        best = self._best()
+        unmeasured = self._next_unmeasured() if explore else None
+        if unmeasured is not None:
+            size, reason = unmeasured, f"measuring Limit={unmeasured} (no full-page samples yet)"
+        elif best is None:
+            size, reason = DEFAULT_PAGE_SIZE, "no measurements yet"
+        elif explore and state["listings"] % PAGE_REPROBE_EVERY == PAGE_REPROBE_EVERY - 1 and self._neighbour(best):
+            size = self._neighbour(best)
+            reason = f"re-measuring Limit={size} next to the current best {best}"
+        else:
+            size = best
+            reason = (f"best measured: {self.sales_per_second(best):.0f} sales/s at "
+                      f"{self.seconds_per_page(best):.2f}s per page, {best} sales per call")
+        if explore:
+            state["listings"] += 1
+        self.choices.append({"page_size": size, "reason": reason, "pages": 0, "rows": 0, "full_listing": explore})
+        return size, reason
+
+    def observe(self, size, rows, latency_seconds, response_bytes):
+        """Record one /salelist page fetched with Limit=size."""
+        if not self.enabled:
+            return
+        stats = self._load()["sizes"].setdefault(str(size), {
+            "pages": 0, "full_pages": 0, "short_listings": 0,
+            "latency_seconds": None, "bytes_per_page": None, "bytes_per_row": None,
+        })
+        stats["pages"] += 1
+        if rows:
+            stats["bytes_per_row"] = _ewma(stats["bytes_per_row"], response_bytes / rows)
+        if rows >= size:
+            stats["full_pages"] += 1
+            stats["short_listings"] = 0
+            stats["latency_seconds"] = _ewma(stats["latency_seconds"], latency_seconds)
+            stats["bytes_per_page"] = _ewma(stats["bytes_per_page"], response_bytes)
+        stats["measured_at"] = time.time()
+        if self.choices and self.choices[-1]["page_size"] == size:
+            self.choices[-1]["pages"] += 1
+            self.choices[-1]["rows"] += rows
+        self._save()
+
+    def finish_listing(self, size):
+        """Close the current listing; a listing with no full page means the account is smaller than size."""
+        if not self.enabled or not self.choices or self.choices[-1]["page_size"] != size:
+            return
+        listing = self.choices[-1]
+        stats = self._stats(size)
+        # Only a full listing (no UpdatedSince filter) tells us how many sales the account has
+        if stats is not None and listing["full_listing"] and listing["rows"] < size:
+            stats["short_listings"] += 1
+            self._save()
+
+    def report(self):
+        """Chosen sizes, reasons and per-size measurements, for the run metrics."""
+        state = self._load()
+        return {
+            "listings": self.choices,
+            "measurements": {
+                size: {
+                    "full_pages": stats["full_pages"],
+                    "latency_seconds": _round(stats["latency_seconds"], 3),
+                    "bytes_per_page": _round(stats["bytes_per_page"], 0),
+                    "sales_per_second": _round(self.sales_per_second(int(size)), 1),
+                }
+                for size, stats in sorted(state["sizes"].items(), key=lambda item: int(item[0]))
+            },
+        }
+
+
+def _ewma(previous, value):
+    return value if previous is None else previous + EWMA_WEIGHT * (value - previous)
+
+
+def _round(value, digits):
+    return None if value is None else round(value, digits)
+
+
+page_size_tuner = PageSizeTuner()
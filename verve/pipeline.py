@@ -0,0 +1,266 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+from verve.main import (
+    API_BASE_URL,
+    iter_window_pages, iter_customer_pages, classify_sales_in_window, send_dear_request, fetch_sale_document,
+    should_skip_existing_stamp, build_update_payload, handle_put_response, report_sale_result,
+)
+from verve.customer_directory import customer_directory
+from verve.quarantine import sale_quarantine
+from verve.stamped_set import stamped_sales
+from verve.structured_log import flush_logs, log
+
+# === STAGED PIPELINE ENGINE ===
+# list -> filter/decide -> fetch detail -> build payload -> PUT, each stage running on its own
+# worker threads and connected by bounded queues. A full queue blocks the stage feeding it
+# (backpressure), so a fast lister can never run more than QUEUE_SIZE items ahead of the
+# rate-limited update stages and memory stays flat on large backfills.
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("VERVE_PIPELINE_QUEUE_SIZE", "200"))
+
+# Workers per stage. The network stages share one rate limiter, so extra workers there
+# only help hide latency; they never exceed the account's call budget. How many of their
+# requests are actually open at once is up to concurrency_limiter (concurrency.py).
+DEFAULT_STAGE_WORKERS = {
+    "list": 1,      # pagination is inherently sequential
+    "decide": 1,
+    "fetch": 4,
+    "build": 1,
+    "put": 4,
+}
+
+_DONE = object()  # end-of-stream marker
+
+
+class MeteredQueue:
+    """queue.Queue that records depth and how long producers/consumers spent blocked."""
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.items = 0
+        self.peak_depth = 0
+        self.put_wait_seconds = 0.0   # upstream blocked because this queue was full (backpressure)
+        self.get_wait_seconds = 0.0   # downstream idle because this queue was empty (starvation)
+
+    def put(self, item):
+        started = time.perf_counter()
+        self._queue.put(item)
+        waited = time.perf_counter() - started
+        depth = self._queue.qsize()
+        with self._lock:
+            self.put_wait_seconds += waited
+            if item is not _DONE:
+                self.items += 1
+            self.peak_depth = max(self.peak_depth, depth)
+
+    def get(self):
+        started = time.perf_counter()
+        item = self._queue.get()
+        with self._lock:
+            self.get_wait_seconds += time.perf_counter() - started
+        return item
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def snapshot(self):
+        return {
+            "queue": self.name,
+            "maxsize": self.maxsize,
+            "depth": self.depth(),
+            "peak_depth": self.peak_depth,
+            "items": self.items,
+            "put_wait_seconds": round(self.put_wait_seconds, 3),
+            "get_wait_seconds": round(self.get_wait_seconds, 3),
+        }
+
+
+class SalePipeline:
+    def __init__(self, from_str, to_str, stamp_cache=None, stage_workers=None,
+                 queue_size=PIPELINE_QUEUE_SIZE, overwrite_mismatched=False, trust_stamp_cache=True):
+        self.from_str, self.to_str = from_str, to_str
+        self.from_date = datetime.strptime(from_str, "%Y-%m-%d")
+        self.to_date = datetime.strptime(to_str, "%Y-%m-%d") + timedelta(days=1)  # Include the entire end day
+        self.stamp_cache = stamp_cache
+        self.overwrite_mismatched = overwrite_mismatched
+        self.trust_stamp_cache = trust_stamp_cache
+        self.workers = {**DEFAULT_STAGE_WORKERS, **(stage_workers or {})}
+
+        self.pages = MeteredQueue("pages", queue_size)
+        self.candidates = MeteredQueue("candidates", queue_size)
+        self.details = MeteredQueue("details", queue_size)
+        self.payloads = MeteredQueue("payloads", queue_size)
+        self.queues = [self.pages, self.candidates, self.details, self.payloads]
+
+        self.results = {"updated": 0, "skipped": 0, "failed": 0}
+        self.cache_skips = 0
+        self._results_lock = threading.Lock()
+
+    def _finish(self, sale, status):
+        with self._results_lock:
+            self.results[status] += 1
+        report_sale_result(sale, status, self.stamp_cache)
+
+    # --- stage bodies: each takes one item and returns the item(s) for the next stage ---
+
+    def _list_stage(self, _):
+        for sales_from_list in iter_window_pages(self.from_str, self.to_str):
+            self.pages.put(sales_from_list)
+
+    def _decide_stage(self, sales_from_list):
+        out = []
+        stamp_cache = self.stamp_cache if self.trust_stamp_cache else None
+        for sale, bucket in classify_sales_in_window(sales_from_list, self.from_date, self.to_date, stamp_cache):
+            if bucket == "unknown" and stamp_cache is not None and stamped_sales.contains(sale["SaleID"]):
+                bucket = "mismatched"  # stamped, but the compact set does not know with what
+            if bucket == "matched" or (bucket == "mismatched" and not self.overwrite_mismatched):
+                # Already stamped on a previous run: no GET needed
+                with self._results_lock:
+                    self.cache_skips += 1
+                self._finish(sale, "skipped")
+                continue
+            if sale_quarantine.holds(sale):
+                self._finish(sale, "skipped")
+                continue
+            out.append(sale)
+        # Any /customer refresh these sales need happens here, once per page, not in the build stage
+        customer_directory.prepare(out, iter_customer_pages)
+        return out
+
+    def _fetch_stage(self, sale):
+        sale_id = sale["SaleID"]
+        try:
+            log.debug("Processing SaleID: %s, OrderNumber: %s", sale_id, sale.get("OrderNumber", "N/A"))
+            detailed_sale_data, error = fetch_sale_document(sale)
+            if detailed_sale_data is None:
+                log.error(f"GET sale {sale_id} failed: {error}")
+                self._finish(sale, "failed")
+                return []
+        except Exception as e:
+            log.error(f"Sale {sale_id} failed: {e}")
+            self._finish(sale, "failed")
+            return []
+        if should_skip_existing_stamp(sale, detailed_sale_data, self.stamp_cache, self.overwrite_mismatched):
+            self._finish(sale, "skipped")
+            return []
+        return [(sale, detailed_sale_data)]
+
+    def _build_stage(self, item):
+        sale, detailed_sale_data = item
+        sale_data_for_put, formatted_date_for_attr = build_update_payload(sale, detailed_sale_data)
+        if sale_data_for_put is None:
+            log.error(formatted_date_for_attr)
+            self._finish(sale, "failed")
+            return []
+        return [(sale, sale_data_for_put, formatted_date_for_attr)]
+
+    def _put_stage(self, item):
+        sale, sale_data_for_put, formatted_date_for_attr = item
+        sale_id = sale["SaleID"]
+        try:
+            log.debug("Attempting to update sale %s via PUT...", sale_id)
+            put_response = send_dear_request("PUT", f"{API_BASE_URL}/sale", "sale_put", sale_id=sale_id, json=sale_data_for_put)
+            status = handle_put_response(sale, put_response, sale_data_for_put, formatted_date_for_attr, self.stamp_cache)
+        except Exception as e:
+            log.error(f"Sale {sale_id} failed: {e}")
+            status = "failed"
+        self._finish(sale, status)
+        return []
+
+    # --- wiring ---
+
+    def _start_stage(self, name, body, inbox, outbox, threads):
+        worker_count = self.workers[name]
+        remaining = [worker_count]
+        remaining_lock = threading.Lock()
+        downstream_workers = self._downstream_workers(name)
+
+        def run():
+            try:
+                if inbox is None:
+                    body(None)
+                else:
+                    while True:
+                        item = inbox.get()
+                        if item is _DONE:
+                            break
+                        try:
+                            outputs = body(item) or ()
+                        except Exception as e:
+                            # Never let one bad item kill a stage: its queue would fill and stall the run
+                            log.error(f"{name} stage failed on an item: {e}")
+                            continue
+                        for out in outputs:
+                            outbox.put(out)
+            finally:
+                # The last worker of a stage tells every worker of the next stage to stop
+                with remaining_lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last and outbox is not None:
+                    for _ in range(downstream_workers):
+                        outbox.put(_DONE)
+
+        for i in range(worker_count):
+            thread = threading.Thread(target=run, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+
+    def _downstream_workers(self, name):
+        order = ["list", "decide", "fetch", "build", "put"]
+        index = order.index(name)
+        return self.workers[order[index + 1]] if index + 1 < len(order) else 0
+
+    def run(self):
+        threads = []
+        self._start_stage("list", self._list_stage, None, self.pages, threads)
+        self._start_stage("decide", self._decide_stage, self.pages, self.candidates, threads)
+        self._start_stage("fetch", self._fetch_stage, self.candidates, self.details, threads)
+        self._start_stage("build", self._build_stage, self.details, self.payloads, threads)
+        self._start_stage("put", self._put_stage, self.payloads, None, threads)
+        for thread in threads:
+            thread.join()
+        return self.results
+
+    def queue_metrics(self):
+        return [q.snapshot() for q in self.queues]
+
+
+def print_queue_metrics(pipeline):
+    print("  Queues (backpressure = producer blocked on a full queue, starved = consumer waiting on an empty one):")
+    print(f"    {'queue':<12}{'max':>6}{'peak':>6}{'items':>8}{'backpressure (s)':>18}{'starved (s)':>13}")
+    for m in pipeline.queue_metrics():
+        print(f"    {m['queue']:<12}{m['maxsize']:>6}{m['peak_depth']:>6}{m['items']:>8}"
+              f"{m['put_wait_seconds']:>18.2f}{m['get_wait_seconds']:>13.2f}")
+    print(f"  Skipped from stamp cache without a GET: {pipeline.cache_skips}")
+    print(f"  Workers per stage: {pipeline.workers}")
+
+
+def parse_stage_workers(spec):
+    """Parse "fetch=8,put=4" into {"fetch": 8, "put": 4}."""
+    workers = {}
+    for part in filter(None, (spec or "").split(",")):
+        name, _, count = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_STAGE_WORKERS or not count.strip().isdigit() or int(count) < 1:
+            raise ValueError(f"Invalid stage worker setting '{part}'. Use e.g. fetch=8,put=4")
+        if name == "list" and int(count) != 1:
+            raise ValueError("The list stage pages sequentially and must have exactly 1 worker")
+        workers[name] = int(count)
+    return workers
+
+
+def run_pipeline_engine(from_str, to_str, stamp_cache=None, stage_workers=None, queue_size=PIPELINE_QUEUE_SIZE):
+    log.info(f"Fetching sales from {from_str} to {to_str} through the staged pipeline...")
+    pipeline = SalePipeline(from_str, to_str, stamp_cache, stage_workers, queue_size)
+    results = pipeline.run()
+    flush_logs()
+    print_queue_metrics(pipeline)
+    return results
@@ -0,0 +1,174 @@
+import json
+import os
+from datetime import datetime
+
+from verve.concurrency import concurrency_limiter
+from verve.decision_kernel import classify_sales
+from verve.freshness import freshness
+from verve.main import get_recent_sale_details
+from verve.page_tuner import page_size_tuner
+from verve.quarantine import sale_quarantine
+from verve.sale_cache import sale_document_cache
+from verve.stamped_set import stamped_sales
+from verve.state_snapshot import read_state
+from verve.structured_log import flush_logs
+from verve.rate_limit import rate_limiter
+
+# === DRY-RUN PLANNING ===
+# `main.py --plan` lists the window (paging only, no GET/PUT per sale), classifies every sale from
+# the local stamp cache and prints how many calls a real run needs and how long it should take.
+# The plan is saved so the next real run over the same window can report estimate vs actual.
+
+PLAN_FILE = os.getenv("VERVE_PLAN_FILE", "last_plan.json")
+RUN_METRICS_FILE = os.getenv("VERVE_RUN_METRICS_FILE", "last_run_metrics.json")
+
+# Seconds per request when no previous run has been measured yet
+DEFAULT_SECONDS_PER_CALL = 0.5
+
+# Calls per sale for each classification. The pipeline engine trusts the stamp cache and
+# skips known-stamped sales without a GET; the other engines GET first unless the sale cache
+# holds the document as of the listed "Updated" ("cached"). Sales held in quarantine cost nothing
+# in any engine.
+CALLS_BY_ACTION = {
+    "sync": {"skip": 1, "cached": 0, "update": 2, "unknown": (1, 2), "held": 0},
+    "async": {"skip": 1, "cached": 0, "update": 2, "unknown": (1, 2), "held": 0},
+    "pipeline": {"skip": 0, "cached": 0, "update": 2, "unknown": (1, 2), "held": 0},
+}
+
+
+# Plan action for each stamp-cache bucket of decision_kernel.classify_sales
+ACTION_BY_BUCKET = {"matched": "skip", "mismatched": "skip", "unstamped": "update", "unknown": "unknown"}
+
+
+def classify_sale_actions(sale_details, stamp_cache):
+    """One plan action per sale, in order: the whole list is bucketed in one kernel pass."""
+    buckets = classify_sales(sale_details, stamp_cache=stamp_cache)
+    actions = [None] * len(sale_details)
+    for bucket, action in ACTION_BY_BUCKET.items():
+        for i in buckets[bucket]:
+            actions[i] = action
+    # Sales missing from the stamp cache may still be known stamped from the compact set
+    for i in buckets["unknown"]:
+        if stamped_sales.knows(sale_details[i]["SaleID"]):
+            actions[i] = "skip"
+    for i, sale in enumerate(sale_details):
+        if actions[i] == "skip" and sale_document_cache.is_fresh_for_listing(
+                sale_document_cache.get(sale["SaleID"]), sale.get("Updated")):
+            actions[i] = "cached"
+    return ["held" if sale_quarantine.holds(sale) else action for sale, action in zip(sale_details, actions)]
+
+
+def load_json(path):
+    data = read_state(path)
+    return json.loads(data) if data is not None else None
+
+
+def save_json(data, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+
+def seconds_per_call(engine):
+    """Effective seconds per call under the current rate budget and the last measured latency."""
+    last_run = load_json(RUN_METRICS_FILE) or {}
+    latency = last_run.get("seconds_per_call", DEFAULT_SECONDS_PER_CALL)
+    interval = rate_limiter.min_interval_seconds
+    if engine == "sync":
+        # One request at a time: each call costs its latency or its rate slot, whichever is longer
+        return max(interval, latency)
+    # Concurrent engines overlap latency, so the rate budget is what bounds them
+    return interval if interval > 0 else latency
+
+
+def build_plan(from_str, to_str, stamp_cache, engine="sync"):
+    calls_before = rate_limiter.calls
+    sale_details = get_recent_sale_details(from_str, to_str)
+    listing_calls = rate_limiter.calls - calls_before
+
+    costs = CALLS_BY_ACTION[engine]
+    counts = {"skip": 0, "cached": 0, "update": 0, "unknown": 0, "held": 0}
+    work_list = []
+    for sale, action in zip(sale_details, classify_sale_actions(sale_details, stamp_cache)):
+        counts[action] += 1
+        if action not in ("skip", "cached", "held") or costs[action]:
+            work_list.append({"SaleID": sale["SaleID"], "OrderNumber": sale.get("OrderNumber"),
+                              "OrderDate": sale.get("OrderDate"), "action": action})
+    # Known updates first: they are certain work; unknowns may turn out to be skips
+    work_list.sort(key=lambda item: {"update": 0, "unknown": 1, "skip": 2, "cached": 2, "held": 3}[item["action"]])
+
+    unknown_min, unknown_max = costs["unknown"]
+    known_calls = listing_calls + sum(counts[action] * costs[action] for action in ("skip", "cached", "update"))
+    calls_min = known_calls + counts["unknown"] * unknown_min
+    calls_max = known_calls + counts["unknown"] * unknown_max
+    per_call = seconds_per_call(engine)
+
+    return {
+        "from": from_str,
+        "to": to_str,
+        "engine": engine,
+        "planned_at": datetime.now().isoformat(timespec="seconds"),
+        "sales": len(sale_details),
+        "counts": counts,
+        "listing_calls": listing_calls,
+        "calls_min": calls_min,
+        "calls_max": calls_max,
+        "seconds_per_call": round(per_call, 3),
+        "duration_min_seconds": round(calls_min * per_call, 1),
+        "duration_max_seconds": round(calls_max * per_call, 1),
+        "work_list": work_list,
+    }
+
+
+def print_plan(plan):
+    counts = plan["counts"]
+    print(f"\n=== PLAN ({plan['engine']} engine, {plan['from']} to {plan['to']}) ===")
+    print(f"  Sales in window: {plan['sales']} ({counts['update']} update, {counts['skip']} skip, "
+          f"{counts.get('cached', 0)} skip from the sale cache, "
+          f"{counts['unknown']} unknown, {counts.get('held', 0)} held in quarantine)")
+    if plan["calls_min"] == plan["calls_max"]:
+        print(f"  API calls needed: {plan['calls_min']} (incl. {plan['listing_calls']} listing pages)")
+    else:
+        print(f"  API calls needed: {plan['calls_min']}-{plan['calls_max']} "
+              f"(incl. {plan['listing_calls']} listing pages; unknowns need 1 call, or 2 if unstamped)")
+    print(f"  Estimated duration: {plan['duration_min_seconds'] / 60:.1f}-{plan['duration_max_seconds'] / 60:.1f} min "
+          f"at {plan['seconds_per_call']}s per call")
+    print("  Work list (in order):")
+    for item in plan["work_list"]:
+        print(f"    {item['action']:<8} {item['SaleID']} (Order {item.get('OrderNumber') or 'N/A'}, {item['OrderDate']})")
+    print(f"  No updates were made. Plan saved to {PLAN_FILE}.")
+
+
+def record_run_metrics(engine, calls, elapsed_seconds):
+    save_json({
+        "engine": engine,
+        "calls": calls,
+        "elapsed_seconds": round(elapsed_seconds, 2),
+        "seconds_per_call": round(elapsed_seconds / calls, 3) if calls else DEFAULT_SECONDS_PER_CALL,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "salelist_page_size": page_size_tuner.report(),
+        "concurrency": concurrency_limiter.report(),
+        "freshness": freshness.report(),
+    }, RUN_METRICS_FILE)
+
+
+def validate_plan_against_run(from_str, to_str, engine, calls, elapsed_seconds):
+    """After a real run, compare it with the saved plan for the same window, if there is one."""
+    plan = load_json(PLAN_FILE)
+    if not plan or (plan["from"], plan["to"], plan["engine"]) != (from_str, to_str, engine):
+        return None
+    calls_ok = plan["calls_min"] <= calls <= plan["calls_max"]
+    duration_ok = elapsed_seconds <= plan["duration_max_seconds"] * 1.25
+    print("\n=== PLAN vs ACTUAL ===")
+    print(f"  Calls:    planned {plan['calls_min']}-{plan['calls_max']}, actual {calls} "
+          f"[{'OK' if calls_ok else 'OFF'}]")
+    print(f"  Duration: planned {plan['duration_min_seconds']:.0f}-{plan['duration_max_seconds']:.0f}s, "
+          f"actual {elapsed_seconds:.0f}s [{'OK' if duration_ok else 'OFF'}]")
+    return {"calls_ok": calls_ok, "duration_ok": duration_ok}
+
+
+def run_plan(from_str, to_str, stamp_cache, engine="sync"):
+    plan = build_plan(from_str, to_str, stamp_cache, engine)
+    save_json(plan, PLAN_FILE)
+    flush_logs()
+    print_plan(plan)
+    return plan
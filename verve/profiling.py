@@ -0,0 +1,126 @@
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+from verve.structured_log import log
+
+# === PROFILING & SLOW-REQUEST TRACING ===
+# Stage timings are always collected (a couple of perf_counter calls per stage).
+# cProfile/tracemalloc only run when enable_profiling() is called, i.e. with --profile.
+#
+# Output (--profile): one <stage>.prof per stage, loadable by snakeviz / flameprof / gprof2dot
+# to get a flamegraph, plus memory_top.txt from tracemalloc and stages.txt with the timing table.
+
+PROFILE_OUTPUT_DIR = "profile_output"
+
+# Any single request slower than this is logged with endpoint, SaleID, size and retries.
+SLOW_REQUEST_THRESHOLD_SECONDS = float(os.getenv("VERVE_SLOW_REQUEST_SECONDS", "5.0"))
+SLOW_REQUEST_LOG_FILE = "slow_requests.jsonl"
+
+_profiling_enabled = False
+_profilers = {}        # stage name -> [cProfile.Profile], one per thread that ran the stage
+# cProfile only sees the thread that enabled it and cannot nest, so each thread profiles its own
+# outermost stage with its own profilers; the report merges them per stage
+_thread_state = threading.local()
+stage_stats = {}       # stage name -> {"count": int, "seconds": float}
+slow_requests = []
+_stats_lock = threading.Lock()  # the pipeline engine records stages from several threads
+
+
+def enable_profiling():
+    global _profiling_enabled
+    _profiling_enabled = True
+    tracemalloc.start(25)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time a block under `name`, and cProfile it when profiling is enabled."""
+    profiler = None
+    if _profiling_enabled and getattr(_thread_state, "active_stage", None) is None:
+        profiler = _thread_profiler(name)
+        try:
+            profiler.enable()
+        except ValueError:  # Python 3.12+: another thread's profiler is active
+            profiler = None
+        else:
+            _thread_state.active_stage = name
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if profiler is not None:
+            profiler.disable()
+            _thread_state.active_stage = None
+        record_stage_time(name, elapsed)
+
+
+def _thread_profiler(name):
+    profilers = getattr(_thread_state, "profilers", None)
+    if profilers is None:
+        profilers = _thread_state.profilers = {}
+    if name not in profilers:
+        profilers[name] = cProfile.Profile()
+        with _stats_lock:
+            _profilers.setdefault(name, []).append(profilers[name])
+    return profilers[name]
+
+
+def record_stage_time(name, elapsed):
+    """For stages that cannot use the context manager (e.g. interleaved coroutines)."""
+    with _stats_lock:
+        stats = stage_stats.setdefault(name, {"count": 0, "seconds": 0.0})
+        stats["count"] += 1
+        stats["seconds"] += elapsed
+
+
+def trace_request(endpoint, elapsed, status_code, sale_id=None, payload_bytes=0, retries=0,
+                  threshold=None):
+    threshold = SLOW_REQUEST_THRESHOLD_SECONDS if threshold is None else threshold
+    if elapsed < threshold:
+        return
+    record = {
+        "endpoint": endpoint,
+        "sale_id": sale_id,
+        "elapsed_seconds": round(elapsed, 3),
+        "status": status_code,
+        "payload_bytes": payload_bytes,
+        "retries": retries,
+    }
+    slow_requests.append(record)
+    log.warning(f"[SLOW] {endpoint} SaleID={sale_id} took {elapsed:.2f}s "
+                f"(status {status_code}, {payload_bytes} bytes, {retries} retries)")
+    with open(SLOW_REQUEST_LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def format_stage_table():
+    total = sum(s["seconds"] for s in stage_stats.values()) or 1.0
+    lines = [f"{'stage':<16}{'count':>8}{'seconds':>10}{'share':>8}"]
+    for name, s in sorted(stage_stats.items(), key=lambda kv: kv[1]["seconds"], reverse=True):
+        lines.append(f"{name:<16}{s['count']:>8}{s['seconds']:>10.2f}{s['seconds'] / total:>8.0%}")
+    return "\n".join(lines)
+
+
+def write_profile_report(output_dir=PROFILE_OUTPUT_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    for name, profilers in _profilers.items():
+        pstats.Stats(*profilers).dump_stats(os.path.join(output_dir, f"{name}.prof"))
+        with open(os.path.join(output_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+            pstats.Stats(*profilers, stream=f).sort_stats("cumulative").print_stats(40)
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        with open(os.path.join(output_dir, "memory_top.txt"), "w", encoding="utf-8") as f:
+            f.write(f"current={current} bytes peak={peak} bytes\n\n")
+            for stat in snapshot.statistics("lineno")[:40]:
+                f.write(f"{stat}\n")
+    with open(os.path.join(output_dir, "stages.txt"), "w", encoding="utf-8") as f:
+        f.write(format_stage_table() + "\n")
+    print(f"  Profile written to {output_dir}/ (open the .prof files with snakeviz or flameprof)")
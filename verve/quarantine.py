@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from verve.concurrency import CONGESTION_STATUSES
+from verve.state_snapshot import read_state
+from verve.structured_log import log
+
+# === POISON-SALE QUARANTINE ===
+# A sale Dear keeps rejecting (voided, locked, failing validation, deleted) used to be fetched and
+# PUT again on every run, failing the same way and spending two rate-limited calls each time.
+#
+#   * Every failure is classified by status and body (classify_failure). Throttling, 5xx, auth and
+#     network problems are transient: the sale is simply tried again next run. Anything else that
+#     the sale itself caused is permanent and the sale goes into QUARANTINE_FILE.
+#   * A quarantined sale is held (reported as skipped, no calls) until its re-check time, which
+#     doubles with every permanent failure: QUARANTINE_BASE_HOURS, 2x, 4x ... up to
+#     QUARANTINE_MAX_DAYS. If its SaleList "Updated" timestamp moves, someone edited it, and it is
+#     re-checked on the next run regardless.
+#   * Any later successful update (or a stamp found already in place) releases it.
+#   * `verve quarantine` prints the report; `verve quarantine --release ID ...` (or --release-all)
+#     lets sales fixed by hand go through on the next run.
+
+QUARANTINE_FILE = os.getenv("VERVE_QUARANTINE_FILE", "quarantine.json")
+QUARANTINE_BASE_HOURS = 24
+QUARANTINE_MAX_DAYS = 30
+MAX_REASON_CHARS = 300
+
+# Statuses that say nothing about the sale itself: the account, the network or Dear is the problem
+TRANSIENT_STATUSES = set(CONGESTION_STATUSES) | {401, 403, 408, 500}
+# Bodies that mark an otherwise permanent-looking status as temporary, and vice versa
+TRANSIENT_HINTS = ("too many", "rate limit", "try again", "timeout", "timed out", "temporarily")
+PERMANENT_HINTS = ("void", "locked", "closed", "credited", "cannot be", "can not be", "not allowed",
+                   "invalid", "validation", "does not exist", "not found")
+
+
+def classify_failure(status_code, body=""):
+    """'transient' or 'permanent' for a failed call. status_code None means no response at all."""
+    if status_code is None:
+        return "transient"
+    text = (body or "").lower()
+    if any(hint in text for hint in TRANSIENT_HINTS):
+        return "transient"
+    if status_code not in TRANSIENT_STATUSES and 400 <= status_code < 500:
+        return "permanent"
+    # A 500 is usually Dear falling over, but it also wraps some business-rule rejections
+    if any(hint in text for hint in PERMANENT_HINTS):
+        return "permanent"
+    return "transient"
+
+
+def _now():
+    return datetime.now().replace(microsecond=0)
+
+
+class SaleQuarantine:
+    def __init__(self, path=QUARANTINE_FILE, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.entries = None
+        self._dirty = False
+        self._lock = threading.RLock()
+        self.stats = {"held": 0, "quarantined": 0, "rechecked": 0, "released": 0, "transient": 0}
+
+    # --- storage ---
+
+    def _load(self):
+        if self.entries is None:
+            try:
+                self.entries = json.loads(read_state(self.path) or b"{}")
+            except (OSError, ValueError):
+                self.entries = {}
+        return self.entries
+
+    def save(self):
+        with self._lock:
+            if not self.enabled or not self._dirty:
+                return
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    # --- per-sale decisions ---
+
+    def holds(self, sale):
+        """True if the sale is quarantined and not due for a re-check: skip it without any call."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            entry = self._load().get(sale["SaleID"])
+            if entry is None:
+                return False
+            edited = sale.get("Updated") and entry.get("list_updated") and sale["Updated"] != entry["list_updated"]
+            if not edited and _now().isoformat() < entry["recheck_after"]:
+                self.stats["held"] += 1
+                return True
+            self.stats["rechecked"] += 1
+            log.info(f"[QUARANTINE] Re-checking sale {sale['SaleID']} "
+                     f"({'edited since' if edited else 'due'}, {entry['failures']} failures so far)")
+            return False
+
+    def record_failure(self, sale, stage, status_code=None, body="", kind=None):
+        """Note a failed sale. kind overrides classify_failure, e.g. "permanent" for an unbuildable payload."""
+        kind = kind or classify_failure(status_code, body)
+        if not self.enabled:
+            return kind
+        with self._lock:
+            if kind != "permanent":
+                self.stats["transient"] += 1
+                return kind
+            entries = self._load()
+            previous = entries.get(sale["SaleID"], {})
+            failures = previous.get("failures", 0) + 1
+            hold = min(timedelta(hours=QUARANTINE_BASE_HOURS * 2 ** (failures - 1)),
+                       timedelta(days=QUARANTINE_MAX_DAYS))
+            now = _now()
+            entries[sale["SaleID"]] = {
+                "order": sale.get("OrderNumber"),
+                "order_date": sale.get("OrderDate"),
+                "stage": stage,
+                "status": status_code,
+                "reason": " ".join(str(body or "").split())[:MAX_REASON_CHARS],
+                "failures": failures,
+                "first_failed": previous.get("first_failed", now.isoformat()),
+                "last_failed": now.isoformat(),
+                "recheck_after": (now + hold).isoformat(),
+                "list_updated": sale.get("Updated"),
+            }
+            self._dirty = True
+            self.stats["quarantined"] += 1
+            log.warning(f"[QUARANTINE] Sale {sale['SaleID']} (Order {sale.get('OrderNumber', 'N/A')}) failed "
+                        f"permanently at {stage} ({status_code}); next re-check after {entries[sale['SaleID']]['recheck_after']}")
+            return kind
+
+    def release(self, sale_id, reason="released"):
+        """Drop a sale from quarantine. Returns True if it was there."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if self._load().pop(sale_id, None) is None:
+                return False
+            self._dirty = True
+            self.stats["released"] += 1
+            log.info(f"[QUARANTINE] Sale {sale_id} {reason}")
+            return True
+
+    # --- reporting ---
+
+    def report(self):
+        """Quarantined sales, soonest re-check first."""
+        with self._lock:
+            return sorted(({"SaleID": sale_id, **entry} for sale_id, entry in self._load().items()),
+                          key=lambda entry: entry["recheck_after"])
+
+
+def print_quarantine_report(entries):
+    print(f"\n=== QUARANTINE ({len(entries)} sales) ===")
+    if not entries:
+        print("  Nothing quarantined.")
+        return
+    print(f"  {'SaleID':<38}{'order':<12}{'stage':<10}{'status':>7}{'fails':>7}  {'re-check after':<21}reason")
+    for entry in entries:
+        print(f"  {entry['SaleID']:<38}{entry.get('order') or 'N/A':<12}{entry['stage']:<10}"
+              f"{str(entry['status']):>7}{entry['failures']:>7}  {entry['recheck_after']:<21}{entry['reason'][:80]}")
+
+
+sale_quarantine = SaleQuarantine()
@@ -0,0 +1,47 @@
+import os
+import threading
+import time
+
+# === API RATE LIMITING SETTINGS ===
+# Dear Systems API limit is 60 calls per 60 seconds.
+# We space the *start* of every call by a small interval to stay well within limits.
+# 1.1 seconds means max ~54 calls/minute. Override with DEAR_API_CALL_DELAY_SECONDS (e.g. 0 for the mock server).
+API_CALL_DELAY_SECONDS = float(os.getenv("DEAR_API_CALL_DELAY_SECONDS", "1.1"))
+
+
+class RateLimiter:
+    """Hands out evenly spaced call slots, shared by the sync and async engines.
+
+    reserve() books the next free slot and returns how long the caller must wait for it,
+    so blocking code can time.sleep() and asyncio code can asyncio.sleep() on the same budget.
+    """
+
+    def __init__(self, min_interval_seconds=API_CALL_DELAY_SECONDS):
+        self.min_interval_seconds = min_interval_seconds
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def reserve(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval_seconds
+            self.calls += 1
+            return slot - now
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        import asyncio  # only the async engine needs it; keep it off the import path of everything else
+
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+# One limiter per process: every Dear call in this account goes through it.
+rate_limiter = RateLimiter()
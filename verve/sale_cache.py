@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# === SALE DOCUMENT CACHE ===
+# On-disk cache of /sale/order bodies, one JSON file per SaleID, so unchanged orders are not
+# downloaded again on every run. An entry is reused:
+#   1. with no request at all, when the SaleList "Updated" timestamp still equals the one the
+#      body was fetched under, or
+#   2. after a conditional GET (If-None-Match / If-Modified-Since) answered with 304, when the
+#      API sent ETag / Last-Modified validators.
+# The directory is size-bounded: least recently used entries are evicted first.
+
+SALE_CACHE_DIR = os.getenv("VERVE_SALE_CACHE_DIR", "sale_cache")
+SALE_CACHE_MAX_BYTES = int(float(os.getenv("VERVE_SALE_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+
+class SaleDocumentCache:
+    def __init__(self, directory=SALE_CACHE_DIR, max_bytes=SALE_CACHE_MAX_BYTES, enabled=True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.stats = {"fresh_hits": 0, "not_modified": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._total_bytes = None  # computed on first store
+
+    def _path(self, sale_id):
+        # SaleIDs are UUIDs; hash anything else so it can never escape the directory
+        name = sale_id if all(c.isalnum() or c == "-" for c in sale_id) else hashlib.sha1(sale_id.encode()).hexdigest()
+        return os.path.join(self.directory, f"{name}.json")
+
+    def get(self, sale_id):
+        if not self.enabled:
+            return None
+        path = self._path(sale_id)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)  # mark as recently used for eviction
+        return entry
+
+    @staticmethod
+    def is_fresh_for_listing(entry, list_updated):
+        """True if the SaleList modification timestamp proves the cached body is current."""
+        return bool(entry and list_updated and entry.get("list_updated") == list_updated)
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, sale_id, body_text, response_headers, list_updated):
+        if not self.enabled:
+            return
+        entry = {
+            "sale_id": sale_id,
+            "etag": response_headers.get("ETag"),
+            "last_modified": response_headers.get("Last-Modified"),
+            "list_updated": list_updated,
+            "cached_at": time.time(),
+            "body": body_text,
+        }
+        data = json.dumps(entry)
+        path = self._path(sale_id)
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+            self._total_bytes += len(data) - previous
+            if self._total_bytes > self.max_bytes:
+                self._evict_to(int(self.max_bytes * 0.9))
+
+    def refresh_listing_timestamp(self, sale_id, entry, list_updated):
+        """After a 304, remember the listing timestamp so the next run can skip the request entirely."""
+        if list_updated and entry.get("list_updated") != list_updated:
+            self.store(sale_id, entry["body"], {"ETag": entry.get("etag"), "Last-Modified": entry.get("last_modified")},
+                       list_updated)
+
+    def evict(self, sale_id):
+        path = self._path(sale_id)
+        with self._lock:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                return
+            if self._total_bytes is not None:
+                self._total_bytes -= size
+
+    def _scan_total_bytes(self):
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                total += entry.stat().st_size
+        return total
+
+    def _evict_to(self, target_bytes):
+        files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in os.scandir(self.directory)
+                 if e.name.endswith(".json")]
+        for _, size, path in sorted(files):
+            if self._total_bytes <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._total_bytes -= size
+            self.stats["evictions"] += 1
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+
+sale_document_cache = SaleDocumentCache()
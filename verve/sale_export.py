@@ -0,0 +1,138 @@
+import os
+import threading
+import uuid
+from datetime import datetime
+
+# === COLUMNAR SALE EXPORT ===
+# Writes every sale summary the sync lists, together with its stamp result, to an append-only
+# Parquet dataset partitioned by OrderDate day:
+#   <export dir>/sales/day=2025-06-19/part-<run>-<n>.parquet
+# Rows are buffered and written in batches; compact_export() later merges each day's small
+# part files into one. Analysts read the files with pyarrow/pandas/DuckDB instead of calling
+# /salelist again, so reporting no longer spends the account's API quota.
+#
+# pyarrow is only imported when the export is enabled (--export-dir or VERVE_EXPORT_DIR), and is
+# checked for before the run's first API call: the rows are only written at flush time, after the PUTs.
+
+EXPORT_DIR = os.getenv("VERVE_EXPORT_DIR")
+EXPORT_BATCH_ROWS = 5000
+COMPACT_MIN_FILES = 8
+
+MISSING_PYARROW_MESSAGE = ('The sale export (--export-dir / VERVE_EXPORT_DIR) needs pyarrow: '
+                           'pip install ".[export]" (or pyarrow>=14).')
+
+EXPORT_COLUMNS = (
+    "sale_id", "order_number", "order_date", "customer_id", "customer", "list_updated",
+    "stamp_status", "stamp_value", "run_at",
+)
+
+
+def _day_of(order_date):
+    return order_date.split("T")[0] if order_date else "unknown"
+
+
+class SaleExporter:
+    def __init__(self, directory=EXPORT_DIR, batch_rows=EXPORT_BATCH_ROWS):
+        self.directory = directory
+        self.batch_rows = batch_rows
+        self.run_at = datetime.now().isoformat(timespec="seconds")
+        # Unique per run so two runs in the same second never overwrite each other's files
+        self.run_tag = new_run_tag()
+        self._rows = []
+        self._parts_written = 0
+        self._lock = threading.Lock()
+        self.rows_written = 0
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def record(self, sale, stamp_status, stamp_value=None):
+        if not self.enabled:
+            return
+        row = {
+            "sale_id": sale.get("SaleID"),
+            "order_number": sale.get("OrderNumber"),
+            "order_date": sale.get("OrderDate"),
+            "customer_id": sale.get("CustomerID"),
+            "customer": sale.get("Customer"),
+            "list_updated": sale.get("Updated"),
+            "stamp_status": stamp_status,
+            "stamp_value": None if stamp_value is None else str(stamp_value),
+            "run_at": self.run_at,
+        }
+        with self._lock:
+            self._rows.append(row)
+            if len(self._rows) >= self.batch_rows:
+                self._flush_locked()
+
+    def flush(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._rows:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        by_day = {}
+        for row in self._rows:
+            by_day.setdefault(_day_of(row["order_date"]), []).append(row)
+        for day, rows in by_day.items():
+            partition = os.path.join(self.directory, "sales", f"day={day}")
+            os.makedirs(partition, exist_ok=True)
+            table = pa.Table.from_pylist(rows, schema=export_schema())
+            self._parts_written += 1
+            pq.write_table(table, os.path.join(partition, f"part-{self.run_tag}-{self._parts_written:05d}.parquet"))
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+
+def pyarrow_available():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
+
+
+def new_run_tag():
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def export_schema():
+    import pyarrow as pa
+
+    return pa.schema([(name, pa.string()) for name in EXPORT_COLUMNS])
+
+
+def compact_export(directory, min_files=COMPACT_MIN_FILES, run_tag=None):
+    """Merge each day partition's part files into one once it has at least min_files of them."""
+    run_tag = run_tag or new_run_tag()
+    import pyarrow.parquet as pq
+    import pyarrow as pa
+
+    sales_dir = os.path.join(directory, "sales")
+    if not os.path.isdir(sales_dir):
+        return 0
+    compacted = 0
+    for partition in sorted(os.listdir(sales_dir)):
+        path = os.path.join(sales_dir, partition)
+        parts = sorted(f for f in os.listdir(path) if f.endswith(".parquet"))
+        if len(parts) < min_files:
+            continue
+        table = pa.concat_tables([pq.read_table(os.path.join(path, f), schema=export_schema()) for f in parts])
+        table = table.sort_by([("sale_id", "ascending"), ("run_at", "ascending")])
+        target = os.path.join(path, f"compacted-{run_tag}.parquet")
+        pq.write_table(table, f"{target}.tmp")
+        os.replace(f"{target}.tmp", target)
+        for f in parts:
+            os.remove(os.path.join(path, f))
+        compacted += 1
+    return compacted
+
+
+sale_exporter = SaleExporter()
@@ -0,0 +1,239 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from verve.decision_kernel import parse_order_day
+from verve.state_snapshot import read_state
+from verve.structured_log import log
+
+# === SALELIST DAY CACHE ===
+# Local copy of /salelist summaries, partitioned by OrderDate day (one JSON file per day), so
+# backfills and audits stop re-paging the whole account on every invocation.
+#
+#   * First run, or when the full copy is older than SALELIST_FULL_REFRESH_DAYS: page everything.
+#   * Otherwise: fetch only sales changed since the newest "Updated" timestamp we hold
+#     (UpdatedSince delta) and merge them into their day partitions, then check the account's
+#     Total against our count with a single Limit=1 call; any mismatch forces a full refresh.
+#   * Days older than SALELIST_CLOSED_DAY_AGE_DAYS are treated as closed: a window made only of
+#     closed days is served straight from disk if the cache was revalidated in the last
+#     SALELIST_CLOSED_RECHECK_SECONDS, with no API call at all.
+#   * Sales without a valid OrderDate (missing, or not YYYY-MM-DD, which the decision kernel calls
+#     invalid_date) are kept in an UNDATED partition: no window ever lists them and their date never
+#     becomes a file name, but they count towards the Total check, which would otherwise fail on
+#     every run.
+#   * A listing cut short by an error never commits: a partial full refresh serves this run from
+#     what it got and leaves the files alone; a partial delta keeps the changes it saw but not its
+#     watermark, so the next run asks for the same changes again.
+
+SALELIST_CACHE_DIR = os.getenv("VERVE_SALELIST_CACHE_DIR", "salelist_cache")
+SALELIST_CLOSED_DAY_AGE_DAYS = 2
+SALELIST_CLOSED_RECHECK_SECONDS = 6 * 3600
+SALELIST_FULL_REFRESH_DAYS = 7
+
+META_FILE = "_meta.json"
+UNDATED = "undated"
+
+
+def _drain(pages, handle):
+    """handle() every page; True unless the listing reported that an error cut it short (returned False)."""
+    while True:
+        try:
+            sales_from_list = next(pages)
+        except StopIteration as stop:
+            return stop.value is not False
+        handle(sales_from_list)
+
+
+class SaleListDayCache:
+    def __init__(self, directory=SALELIST_CACHE_DIR, enabled=True):
+        self.directory = directory
+        self.enabled = enabled
+        self.meta = None
+        self._days = {}   # loaded partitions: day -> {SaleID: summary}
+        self._index = None  # SaleID -> day, built only when a changed sale is not in its day
+        self.stats = {"full_refreshes": 0, "delta_refreshes": 0, "changed_sales": 0, "served_without_calls": 0}
+
+    # --- storage ---
+
+    def _day_path(self, day):
+        return os.path.join(self.directory, f"{day}.json")
+
+    def _load_meta(self):
+        if self.meta is None:
+            path = os.path.join(self.directory, META_FILE)
+            try:
+                self.meta = json.loads(read_state(path) or b"{}")
+            except (OSError, ValueError):
+                self.meta = {}
+        return self.meta
+
+    def _save_meta(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_json(os.path.join(self.directory, META_FILE), self.meta)
+
+    def _load_day(self, day):
+        if day not in self._days:
+            try:
+                self._days[day] = json.loads(read_state(self._day_path(day)) or b"{}")
+            except (OSError, ValueError):
+                self._days[day] = {}
+        return self._days[day]
+
+    def _save_day(self, day):
+        os.makedirs(self.directory, exist_ok=True)
+        self._write_json(self._day_path(day), self._days[day])
+
+    @staticmethod
+    def _write_json(path, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _day_of(sale):
+        order_day = parse_order_day(sale.get("OrderDate")) if sale.get("OrderDate") else None
+        return order_day.date().isoformat() if order_day else UNDATED
+
+    def _sale_index(self):
+        if self._index is None:
+            self._index = {}
+            for day in self._load_meta().get("day_counts", {}):
+                for sale_id in self._load_day(day):
+                    self._index[sale_id] = day
+        return self._index
+
+    # --- refresh strategies ---
+
+    def _full_refresh(self, iter_pages):
+        log.info("[SALELIST CACHE] Full refresh of the SaleList copy...")
+        days = {}
+        watermark = None
+
+        def add_page(sales_from_list):
+            nonlocal watermark
+            for sale in sales_from_list:
+                if "SaleID" not in sale:
+                    continue
+                days.setdefault(self._day_of(sale), {})[sale["SaleID"]] = sale
+                if sale.get("Updated") and (watermark is None or sale["Updated"] > watermark):
+                    watermark = sale["Updated"]
+
+        complete = _drain(iter_pages(None), add_page)
+        day_counts = {day: len(sales) for day, sales in days.items()}
+        self._days = days
+        self._index = None
+        if not complete:
+            # Serve this run from what was listed (in memory only); the files and meta stay as they were
+            log.warning("[SALELIST CACHE] Listing was cut short; not saving it as a full refresh.")
+            self.meta = {"watermark": None, "day_counts": day_counts}
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and name != META_FILE:
+                os.remove(os.path.join(self.directory, name))
+        for day in days:
+            self._save_day(day)
+        now = time.time()
+        self.meta = {
+            "last_full_refresh": now,
+            "last_checked": now,
+            "watermark": watermark,
+            "day_counts": day_counts,
+        }
+        self._save_meta()
+        self.stats["full_refreshes"] += 1
+
+    def _delta_refresh(self, iter_pages, fetch_total):
+        meta = self.meta
+        watermark = meta["watermark"]
+        log.info(f"[SALELIST CACHE] Fetching sales updated since {watermark}...")
+        touched = set()
+
+        def merge_page(sales_from_list):
+            for sale in sales_from_list:
+                if "SaleID" not in sale:
+                    continue
+                day = self._day_of(sale)
+                partition = self._load_day(day)
+                if sale["SaleID"] not in partition:
+                    # New sale, or its OrderDate moved: it must leave its old partition
+                    old_day = self._sale_index().get(sale["SaleID"])
+                    if old_day and old_day != day:
+                        del self._load_day(old_day)[sale["SaleID"]]
+                        touched.add(old_day)
+                    self._index[sale["SaleID"]] = day
+                partition[sale["SaleID"]] = sale
+                touched.add(day)
+                self.stats["changed_sales"] += 1
+                if sale.get("Updated") and sale["Updated"] > meta["watermark"]:
+                    meta["watermark"] = sale["Updated"]
+
+        complete = _drain(iter_pages({"UpdatedSince": watermark}), merge_page)
+        for day in touched:
+            self._save_day(day)
+            meta["day_counts"][day] = len(self._days[day])
+        if not complete:
+            # The changes we got are real, but ones we missed may be older than the newest we saw
+            log.warning("[SALELIST CACHE] Delta listing was cut short; keeping the old watermark.")
+            meta["watermark"] = watermark
+            self._save_meta()
+            return True
+
+        # Deletions never show up in a delta, so compare the account Total with what we hold
+        total = fetch_total()
+        held = sum(meta["day_counts"].values())
+        if total is not None and total != held:
+            log.warning(f"[SALELIST CACHE] Account Total {total} != cached {held}. Falling back to a full refresh.")
+            return False
+        meta["last_checked"] = time.time()
+        self._save_meta()
+        self.stats["delta_refreshes"] += 1
+        return True
+
+    # --- public API ---
+
+    def find(self, sale_id=None, order_number=None):
+        """The cached SaleList summary with this SaleID or OrderNumber, without any API call."""
+        for day in sorted(self._load_meta().get("day_counts", {}), reverse=True):
+            partition = self._load_day(day)
+            if sale_id and sale_id in partition:
+                return partition[sale_id]
+            if order_number:
+                for sale in partition.values():
+                    if sale.get("OrderNumber") == order_number:
+                        return sale
+        return None
+
+    def iter_window_pages(self, from_date_str, to_date_str, iter_pages, fetch_total):
+        """Yield the cached SaleList summaries for each day of the window, refreshing first as needed.
+
+        iter_pages(extra_params) pages /salelist; fetch_total() returns the account's sale Total.
+        """
+        meta = self._load_meta()
+        now = time.time()
+        closed_before = (datetime.today() - timedelta(days=SALELIST_CLOSED_DAY_AGE_DAYS)).strftime("%Y-%m-%d")
+
+        if not meta or not meta.get("watermark") or \
+                now - meta.get("last_full_refresh", 0) > SALELIST_FULL_REFRESH_DAYS * 86400:
+            self._full_refresh(iter_pages)
+        elif to_date_str < closed_before and now - meta.get("last_checked", 0) < SALELIST_CLOSED_RECHECK_SECONDS:
+            self.stats["served_without_calls"] += 1
+            log.info("[SALELIST CACHE] Window is closed days only; serving from cache without API calls.")
+        elif not self._delta_refresh(iter_pages, fetch_total):
+            self._full_refresh(iter_pages)
+
+        day = datetime.strptime(from_date_str, "%Y-%m-%d")
+        last_day = datetime.strptime(to_date_str, "%Y-%m-%d")
+        while day <= last_day:
+            key = day.strftime("%Y-%m-%d")
+            if key in self.meta["day_counts"]:
+                sales = list(self._load_day(key).values())
+                if sales:
+                    yield sales
+            day += timedelta(days=1)
+
+
+salelist_cache = SaleListDayCache()
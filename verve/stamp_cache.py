@@ -0,0 +1,64 @@
+import json
+import os
+from datetime import datetime
+
+from verve.state_snapshot import read_state
+from verve.structured_log import log
+
+# === STAMP CACHE SETTINGS ===
+# Local record of what we last saw (or wrote) in AdditionalAttribute2 for each sale.
+# It lets the audit compare stamps against OrderDate without a GET per sale.
+STAMP_CACHE_FILE = os.getenv("VERVE_STAMP_CACHE_FILE", "stamp_cache.json")
+
+# Formats AdditionalAttribute2 has been written in over time:
+# main.py writes MM/DD/YYYY, older scripts (test5.py) wrote plain YYYY-MM-DD.
+STAMP_DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d")
+
+
+def load_stamp_cache(path=STAMP_CACHE_FILE):
+    try:
+        data = read_state(path)
+        return json.loads(data) if data is not None else {}
+    except (OSError, ValueError) as e:
+        log.warning(f"Could not read stamp cache {path}: {e}. Starting with an empty cache.")
+        return {}
+
+
+def save_stamp_cache(stamp_cache, path=STAMP_CACHE_FILE):
+    # Write to a temp file first so an interrupted run never leaves a half-written cache
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stamp_cache, f)
+    os.replace(tmp_path, path)
+
+
+def record_stamp(stamp_cache, sale_id, order_date, attr2_value):
+    if stamp_cache is None:
+        return
+    stamp_cache[sale_id] = {
+        "OrderDate": order_date,
+        "AdditionalAttribute2": attr2_value,
+        "CheckedAt": datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def parse_stamp_date(value):
+    """Parse a stamped or API date string into a date, or None if it is not a recognised format."""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    # ISO timestamps from the API, e.g. "2025-06-19T00:00:00"
+    value = value.split("T")[0]
+    for fmt in STAMP_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def stamp_matches_order_date(attr2_value, order_date_str):
+    stamped = parse_stamp_date(attr2_value)
+    return stamped is not None and stamped == parse_stamp_date(order_date_str)
@@ -0,0 +1,198 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from datetime import datetime
+
+from verve.structured_log import log
+
+# === WARM-START STATE SNAPSHOT ===
+# Scheduled CI runs start on a clean runner. Everything a run learns (stamp cache, compact stamped
+# set, quarantine, customer directory, page-size tuning, last run's metrics and concurrency limit,
+# the freshness history, the SaleList day cache and its delta watermark) is packed into one
+# versioned SNAPSHOT_FILE, which verve_date_sync.yml carries between runs with actions/cache.
+#
+#   header   magic, SNAPSHOT_VERSION, length of the table of contents
+#   toc      JSON: {"created": ..., "members": {path: [offset, length]}}
+#   members  the state files' bytes, each 8-byte aligned
+#
+# A run does not unpack it. The snapshot is memory-mapped on first use and each module reads
+# its own member when (and if) it needs it, through read_state(); the stamped set maps its
+# columns straight out of the snapshot without a copy. A working file on disk always wins over
+# its snapshot copy, so everything a run writes is picked up by the next `verve snapshot save`,
+# and members nobody touched are carried over from the previous snapshot.
+#
+# The sale document cache is left out: it is large, bounded by its own size cap, and only saves
+# bandwidth on sales that need a GET anyway. A snapshot of another version is ignored (the run
+# starts cold, as it would without one).
+
+SNAPSHOT_FILE = os.getenv("VERVE_SNAPSHOT_FILE", "verve_state.snap")
+SNAPSHOT_VERSION = 1
+MAGIC = b"VSNP"
+HEADER = struct.Struct("<4sIQ")  # magic, version, toc length
+ALIGNMENT = 8
+
+
+def _key(path):
+    return os.path.normpath(path).replace(os.sep, "/")
+
+
+class StateSnapshot:
+    def __init__(self, path=SNAPSHOT_FILE, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._opened = False
+        self._map = None
+        self.created = None
+        self.members = {}  # path -> (offset, length)
+
+    def _open(self):
+        with self._lock:
+            if self._opened:
+                return
+            self._opened = True
+            try:
+                f = open(self.path, "rb")
+            except OSError:
+                return
+            with f:
+                if os.fstat(f.fileno()).st_size < HEADER.size:
+                    return
+                snapshot_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, toc_length = HEADER.unpack_from(snapshot_map)
+            if magic != MAGIC or version != SNAPSHOT_VERSION:
+                log.warning(f"{self.path} is not a version {SNAPSHOT_VERSION} state snapshot; starting cold.")
+                snapshot_map.close()
+                return
+            toc = json.loads(snapshot_map[HEADER.size:HEADER.size + toc_length])
+            self._map = snapshot_map
+            self.created = toc.get("created")
+            self.members = {path: tuple(span) for path, span in toc["members"].items()}
+
+    def view(self, path):
+        """Zero-copy memoryview of a member, or None if the snapshot does not have it."""
+        if not self.enabled:
+            return None
+        if not self._opened:
+            self._open()
+        span = self.members.get(_key(path))
+        if span is None:
+            return None
+        offset, length = span
+        return memoryview(self._map)[offset:offset + length]
+
+    def write(self, paths):
+        """Pack paths (working file if present, else this snapshot's copy) into a new snapshot file."""
+        if not self._opened:
+            self._open()
+        contents = {}
+        for path in paths:
+            key = _key(path)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    contents[key] = f.read()
+            elif key in self.members:
+                contents[key] = self.view(path)
+
+        # Offsets depend on the TOC length, which depends on the offsets: lay out twice
+        toc_length = 0
+        while True:
+            offset = HEADER.size + toc_length
+            members = {}
+            for key, data in contents.items():
+                offset += -offset % ALIGNMENT
+                members[key] = [offset, len(data)]
+                offset += len(data)
+            toc = json.dumps({"created": datetime.now().isoformat(timespec="seconds"), "members": members}).encode()
+            if len(toc) <= toc_length:
+                break
+            toc_length = len(toc) + 64
+        toc = toc.ljust(toc_length)
+
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION, toc_length))
+            f.write(toc)
+            for key, data in contents.items():
+                f.write(bytes(members[key][0] - f.tell()))
+                f.write(data)
+        # This process may still hold views into the old map; it stays valid after the replace
+        os.replace(tmp_path, self.path)
+        return {key: length for key, (_, length) in members.items()}
+
+    def materialize(self, path):
+        """Copy a member to its working path unless that exists already. Returns True if written."""
+        if os.path.exists(path):
+            return False
+        data = self.view(path)
+        if data is None:
+            return False
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return True
+
+    def restore(self):
+        """Write out every member that has no working file yet. Returns the paths written."""
+        if not self._opened:
+            self._open()
+        return [path for path in list(self.members) if self.materialize(path)]
+
+
+snapshot = StateSnapshot()
+
+
+def read_state(path):
+    """The bytes of a state file: the working file if there is one, else its snapshot copy, else None."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    data = snapshot.view(path)
+    return None if data is None else bytes(data)
+
+
+def map_state(path):
+    """Like read_state, but a read-only mmap (working file) or memoryview (snapshot) instead of a copy."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return snapshot.view(path)
+
+
+def materialize(path):
+    """Bring a file's snapshot copy to disk before appending to it, so the append does not replace it."""
+    return snapshot.materialize(path)
+
+
+def state_paths():
+    """Every file that belongs in a snapshot."""
+    from verve.customer_directory import CUSTOMER_DIRECTORY_FILE
+    from verve.freshness import FRESHNESS_FILE
+    from verve.page_tuner import PAGE_TUNING_FILE
+    from verve.planner import PLAN_FILE, RUN_METRICS_FILE
+    from verve.quarantine import QUARANTINE_FILE
+    from verve.salelist_cache import META_FILE, salelist_cache
+    from verve.stamp_cache import STAMP_CACHE_FILE
+    from verve.stamped_set import stamped_sales
+
+    paths = [STAMP_CACHE_FILE, stamped_sales.path, stamped_sales.log_path, QUARANTINE_FILE,
+             CUSTOMER_DIRECTORY_FILE, PAGE_TUNING_FILE, RUN_METRICS_FILE, PLAN_FILE, FRESHNESS_FILE]
+    # The SaleList day cache: its meta (watermark, day counts) and the days it still lists
+    paths.append(os.path.join(salelist_cache.directory, META_FILE))
+    paths.extend(os.path.join(salelist_cache.directory, f"{day}.json")
+                 for day in salelist_cache._load_meta().get("day_counts", {}))
+    return paths
+
+
+def save_snapshot():
+    """Pack the current state into SNAPSHOT_FILE. Returns {path: bytes} of what went in."""
+    return snapshot.write(state_paths())
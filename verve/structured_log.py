@@ -0,0 +1,135 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+# === STRUCTURED LOGGING ===
+# Every engine logs through the "verve" logger instead of print():
+#   * Records are handed to a queue and written by a background listener thread, so a sale
+#     never waits on stdout (or on the Actions log pipe).
+#   * Per-sale chatter ("Fetching full sale record...", "Set AdditionalAttribute2...") is DEBUG,
+#     so it is off unless --log-level DEBUG. Each sale instead gets one compact summary record
+#     (see log_sale) with its outcome.
+#   * Records tagged with a sample key (skipped-sale summaries, page progress) are sampled:
+#     the first LOG_SAMPLE_FIRST of each key pass, then one in LOG_SAMPLE_EVERY. The number
+#     dropped is reported at the end of the run.
+#   * VERVE_LOG_FORMAT=json (or --log-format json) writes one JSON object per line.
+#
+# Reports (run summary, audit, plan, queue metrics) are still printed: they are output, not logs.
+
+LOG_LEVEL = os.getenv("VERVE_LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("VERVE_LOG_FORMAT", "text")
+LOG_SAMPLE_FIRST = int(os.getenv("VERVE_LOG_SAMPLE_FIRST", "20"))
+LOG_SAMPLE_EVERY = int(os.getenv("VERVE_LOG_SAMPLE_EVERY", "100"))
+
+log = logging.getLogger("verve")
+
+_listener = None
+_sampler = None
+
+
+class SamplingFilter(logging.Filter):
+    """Let through the first `first` records of each sample key, then one in `every`."""
+
+    def __init__(self, first=LOG_SAMPLE_FIRST, every=LOG_SAMPLE_EVERY):
+        super().__init__()
+        self.first = first
+        self.every = max(every, 1)
+        self.seen = {}
+        self.dropped = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None:
+            return True
+        with self._lock:
+            count = self.seen[key] = self.seen.get(key, 0) + 1
+            if count <= self.first or (count - self.first) % self.every == 0:
+                return True
+            self.dropped[key] = self.dropped.get(key, 0) + 1
+            return False
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(message)s", datefmt="%H:%M:%S")
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {"ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                 "level": record.levelname}
+        fields = getattr(record, "fields", None)
+        if fields is not None:
+            entry.update(fields)
+        else:
+            entry["msg"] = record.getMessage()
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(",", ":"), default=str)
+
+
+class _CurrentStdout:
+    """Resolve sys.stdout at write time, so contextlib.redirect_stdout (multi_account, benchmarks) applies."""
+
+    def write(self, text):
+        sys.stdout.write(text)
+
+    def flush(self):
+        sys.stdout.flush()
+
+
+def configure_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, sample_first=LOG_SAMPLE_FIRST, sample_every=LOG_SAMPLE_EVERY):
+    """(Re)build the queue handler and listener. Safe to call again, e.g. once the CLI flags are parsed."""
+    global _listener, _sampler
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(log.handlers):
+        log.removeHandler(handler)
+
+    stream_handler = logging.StreamHandler(_CurrentStdout())
+    stream_handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # Sample before the record is formatted and queued, so dropped records cost almost nothing
+    _sampler = SamplingFilter(sample_first, sample_every)
+    queue_handler.addFilter(_sampler)
+
+    log.addHandler(queue_handler)
+    log.setLevel(level.upper() if isinstance(level, str) else level)
+    log.propagate = False
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def flush_logs():
+    """Block until every queued record has been written."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def sampling_report():
+    """{sample key: records dropped} for this run."""
+    return dict(_sampler.dropped) if _sampler else {}
+
+
+def log_sale(sale, status, stamp=None, **fields):
+    """One compact summary record per processed sale. Skips are sampled; updates and failures never are."""
+    summary = {"event": "sale", "sale_id": sale.get("SaleID"), "order": sale.get("OrderNumber"),
+               "order_date": sale.get("OrderDate"), "status": status}
+    if stamp is not None:
+        summary["stamp"] = stamp
+    summary.update(fields)
+    log.info("sale %s", json.dumps(summary, separators=(",", ":")),
+             extra={"fields": summary, "sample": "sale_skipped" if status == "skipped" else None})
+
+
+configure_logging()
+atexit.register(lambda: _listener and _listener.stop())
@@ -0,0 +1,8 @@
+# Launcher for `python verve_cli.py <command>` in a checkout. The code is verve/cli.py, installed
+# as the `verve` command.
+import sys
+
+from verve.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())